@@ -0,0 +1,129 @@
+"""
+Benchmark için yerel Gemini taklidi
+
+google.generativeai istemcisini süreç içinde yamalar: ağ çağrısı yapılmaz,
+API ücreti ödenmez. Gecikme ve token sayıları ayarlanabilir; böylece
+main_receiver'ın kendi yükü (DB, prompt, guard, serileştirme) ölçülebilir.
+
+Ayarlar (ortam değişkeni veya install() argümanları):
+    FAKE_GEMINI_LATENCY_MS        Yanıt gecikmesi (varsayılan: 200)
+    FAKE_GEMINI_JITTER_MS         Gecikmeye eklenen rastgele sapma (varsayılan: 0)
+    FAKE_GEMINI_PROMPT_TOKENS     usage_metadata.prompt_token_count (varsayılan: 600)
+    FAKE_GEMINI_OUTPUT_TOKENS     Üretilen kelime / token sayısı (varsayılan: 60)
+    FAKE_GEMINI_STREAM_CHUNKS     Akışlı yanıtta parça sayısı (varsayılan: 6)
+"""
+# YAZAN: DevOps & QA Engineer
+
+import asyncio
+import os
+import random
+import time
+
+import google.generativeai as genai
+
+_WORDS = ["Değerli", "müşterimiz,", "ürünümüz", "kaliteli", "malzemeden", "üretilir", "ve", "garantilidir."]
+
+SETTINGS = {}
+CALLS = {"generate": 0, "count_tokens": 0}
+
+
+def _delay() -> float:
+    latency = SETTINGS["latency_ms"] + random.uniform(0, SETTINGS["jitter_ms"])
+    return max(0.0, latency) / 1000.0
+
+
+def _reply_text() -> str:
+    n = SETTINGS["output_tokens"]
+    return " ".join(_WORDS[i % len(_WORDS)] for i in range(n))
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    """GenerateContentResponse'un main_receiver'ın kullandığı kısmı."""
+
+    def __init__(self, text: str, chunks=None, chunk_delay: float = 0.0):
+        self.text = text
+        self._chunks = chunks or [text]
+        self._chunk_delay = chunk_delay
+        self.usage_metadata = _Usage(SETTINGS["prompt_tokens"], SETTINGS["output_tokens"])
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._chunk_delay)
+            yield FakeResponse(chunk)
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._chunk_delay)
+            yield FakeResponse(chunk)
+
+
+class _TokenCount:
+    def __init__(self, total: int):
+        self.total_tokens = total
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str = "fake", generation_config=None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config
+
+    def _response(self, stream: bool) -> FakeResponse:
+        CALLS["generate"] += 1
+        text = _reply_text()
+        if not stream:
+            return FakeResponse(text)
+        words = text.split(" ")
+        n = max(1, min(SETTINGS["stream_chunks"], len(words)))
+        size = (len(words) + n - 1) // n
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        return FakeResponse(text, chunks, _delay() / len(chunks))
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        if not stream:
+            time.sleep(_delay())
+        return self._response(stream)
+
+    async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+        if not stream:
+            await asyncio.sleep(_delay())
+        return self._response(stream)
+
+    def count_tokens(self, contents):
+        CALLS["count_tokens"] += 1
+        return _TokenCount(len(str(contents)) // 4)
+
+    async def count_tokens_async(self, contents):
+        CALLS["count_tokens"] += 1
+        return _TokenCount(len(str(contents)) // 4)
+
+
+def install(latency_ms: float = None, jitter_ms: float = None, prompt_tokens: int = None,
+            output_tokens: int = None, stream_chunks: int = None):
+    """genai.GenerativeModel / genai.configure'u taklitle değiştirir (main_receiver import edilmeden önce)."""
+    SETTINGS.update({
+        "latency_ms": float(latency_ms if latency_ms is not None else os.getenv("FAKE_GEMINI_LATENCY_MS", "200")),
+        "jitter_ms": float(jitter_ms if jitter_ms is not None else os.getenv("FAKE_GEMINI_JITTER_MS", "0")),
+        "prompt_tokens": int(prompt_tokens if prompt_tokens is not None else os.getenv("FAKE_GEMINI_PROMPT_TOKENS", "600")),
+        "output_tokens": int(output_tokens if output_tokens is not None else os.getenv("FAKE_GEMINI_OUTPUT_TOKENS", "60")),
+        "stream_chunks": int(stream_chunks if stream_chunks is not None else os.getenv("FAKE_GEMINI_STREAM_CHUNKS", "6")),
+    })
+    os.environ.setdefault("GEMINI_API_KEY", "fake-benchmark-key")
+    genai.GenerativeModel = FakeGenerativeModel
+    genai.configure = lambda **kwargs: None
+    try:
+        # Paylaşılan async istemci de hiç oluşturulmasın (ağ/kimlik bilgisi gerekmez)
+        from google.generativeai import client as genai_client
+        genai_client.get_default_generative_async_client = lambda: None
+    except Exception:
+        pass
+    return dict(SETTINGS)
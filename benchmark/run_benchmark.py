@@ -0,0 +1,406 @@
+"""
+Kremna yük testi / benchmark aracı
+
+main_receiver'ı sahte Gemini ile (benchmark/serve_main.py) ve port-yönetimi
+proxy'sini (local_api_server.py) alt süreç olarak başlatır; /chat, /agents,
+/agent_config ve /send_json endpoint'lerini hedef eşzamanlılıkta çalıştırır.
+SQLite ve (verilirse) yerel PostgreSQL için p50/p95/p99 gecikme, saniyedeki
+istek sayısı ve istek başına DB sorgusu makine tarafından okunabilir JSON
+olarak raporlanır. --baseline ile önceki bir sürümün çıktısıyla kıyaslanır.
+
+Örnek:
+    python benchmark/run_benchmark.py --concurrency 16 --requests 400 --output bench.json
+    python benchmark/run_benchmark.py --postgres-url postgresql://localhost/kremna_bench \\
+        --backends sqlite,postgres --baseline bench.json --max-regression 0.15
+
+Sadece standart kütüphane kullanır (ek bağımlılık gerekmez).
+"""
+# YAZAN: DevOps & QA Engineer
+
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+PROXY_DIR = ROOT_DIR / "port-yönetimi"
+
+ENDPOINTS = ["/agents", "/agent_config", "/chat", "/send_json"]
+
+MESSAGES = [
+    "Merhaba, ürünleriniz hakkında bilgi alabilir miyim?",
+    "Fiyatlar neden bu kadar yüksek?",
+    "Garanti süresi ne kadar?",
+    "Kargo ne zaman gelir?",
+    "Malzeme kalitesi hakkında bilgi verir misiniz?",
+]
+
+# Write-behind geçmiş yazıcısının kuyruğu boşaltması için beklenen süre (sn)
+SETTLE_SECONDS = 0.3
+
+
+# --------------------------------------------------
+# Alt süreçler
+# --------------------------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port: int, path: str, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Sunucu başlatılamadı (port {port}, çıkış kodu {proc.returncode})")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Sunucu {timeout} sn içinde hazır olmadı (port {port})")
+
+
+def start_main_server(backend: str, postgres_url: str, workdir: Path, fake_env: dict) -> tuple:
+    port = free_port()
+    env = dict(os.environ)
+    env.update(fake_env)
+    # SQLite için boş DATABASE_URL (.env'deki değer de ezilir); DB backend dizinine yazılır
+    env["DATABASE_URL"] = postgres_url if backend == "postgres" else ""
+    env["DB_PATH"] = str(workdir / backend / "personas.db")
+    # sqlite-untuned: ayarlı SQLite modundan önceki davranış (havuz + varsayılan pragmalar)
+    env["SQLITE_TUNED"] = "0" if backend == "sqlite-untuned" else "1"
+    run_dir = workdir / backend / "run"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    proc = subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / "serve_main.py"), "--port", str(port)],
+        cwd=str(run_dir), env=env
+    )
+    wait_ready(port, "/__bench__/counters", proc)
+    return proc, port
+
+
+def start_proxy(main_port: int) -> tuple:
+    port = free_port()
+    env = dict(os.environ)
+    env["MAIN_BASE_URL"] = f"http://127.0.0.1:{main_port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "local_api_server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=str(PROXY_DIR), env=env
+    )
+    wait_ready(port, "/docs", proc)
+    return proc, port
+
+
+def stop(proc: subprocess.Popen):
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# --------------------------------------------------
+# HTTP istemcisi (worker başına keep-alive bağlantı)
+# --------------------------------------------------
+class Client:
+    def __init__(self, port: int, timeout: float = 30.0):
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method: str, path: str, body=None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json; charset=utf-8"} if payload else {}
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                resp = self.conn.getresponse()
+                resp.read()
+                return resp.status, time.perf_counter() - started
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    return 0, time.perf_counter() - started
+
+
+def get_counters(port: int) -> dict:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", "/__bench__/counters")
+    data = json.loads(conn.getresponse().read())
+    conn.close()
+    return data
+
+
+# --------------------------------------------------
+# İş yükü
+# --------------------------------------------------
+def agent_config_body(agent_index: int) -> dict:
+    return {
+        "agentId": f"bench-agent-{agent_index}",
+        "persona_title": "Benchmark Müşteri Temsilcisi",
+        "model_instructions": {
+            "tone": "Resmi ve çözüm odaklı",
+            "rules": ["Cevaplar 4 cümleyi geçmemelidir.", "Türkçe cevap ver."],
+            "prohibited_topics": ["Rakiplerin fiyatları", "Siyasi görüşler"],
+        },
+        "initial_context": {"company_slogan": "Kalite Asla Tesadüf Değildir."},
+    }
+
+
+def make_request(endpoint: str, i: int, args, run_id: str):
+    """i. istek için (method, path, body) üretir."""
+    if endpoint == "/agents":
+        return "GET", "/agents", None
+    if endpoint == "/agent_config":
+        return "POST", "/agent_config", agent_config_body(i % args.agents)
+    chat = {
+        "agent_id": f"bench-agent-{i % args.agents}",
+        # Her oturum `turns_per_session` tur sürer; geçmiş okuma/yazma gerçekçi olsun
+        "session_id": f"bench-{run_id}-{endpoint.strip('/')}-{i // (args.agents * args.turns_per_session)}-{i % args.agents}",
+        "user_message": MESSAGES[(i // args.agents) % len(MESSAGES)],
+    }
+    if endpoint == "/chat":
+        return "POST", "/chat", chat
+    chat["endpoint"] = "/chat"
+    return "POST", "/send_json", chat
+
+
+def percentile(sorted_values, q: float) -> float:
+    """En yakın sıra (nearest-rank) yöntemiyle yüzdelik."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def run_phase(endpoint: str, port: int, main_port: int, args, run_id: str) -> dict:
+    offset = itertools.count()
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+
+    def worker(n_requests: int, record: bool):
+        client = Client(port)
+        while True:
+            with lock:
+                i = next(offset)
+            if i >= n_requests:
+                return
+            method, path, body = make_request(endpoint, i, args, run_id)
+            status, elapsed = client.request(method, path, body)
+            if record:
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+    # Isınma (ölçülmez)
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(worker, args.warmup, False)
+    time.sleep(SETTLE_SECONDS)
+
+    offset = itertools.count(args.warmup)
+    before = get_counters(main_port)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [pool.submit(worker, args.warmup + args.requests, True) for _ in range(args.concurrency)]
+        for f in futures:
+            f.result()
+    wall = time.perf_counter() - started
+    time.sleep(SETTLE_SECONDS)
+    after = get_counters(main_port)
+
+    values = sorted(latencies)
+    n = len(values)
+    errors = sum(count for status, count in statuses.items() if not 200 <= status < 300)
+    return {
+        "requests": n,
+        "errors": errors,
+        "status_counts": {str(k): v for k, v in sorted(statuses.items())},
+        "duration_s": round(wall, 3),
+        "rps": round(n / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(values, 50) * 1000, 3),
+            "p95": round(percentile(values, 95) * 1000, 3),
+            "p99": round(percentile(values, 99) * 1000, 3),
+            "mean": round(sum(values) / n * 1000, 3) if n else 0.0,
+            "max": round(values[-1] * 1000, 3) if n else 0.0,
+        },
+        "db_queries_per_request": round((after["db_queries"] - before["db_queries"]) / n, 3) if n else 0.0,
+        "gemini_calls_per_request": round((after["gemini_calls"] - before["gemini_calls"]) / n, 3) if n else 0.0,
+    }
+
+
+def run_backend(backend: str, args, workdir: Path, fake_env: dict) -> dict:
+    main_proc = proxy_proc = None
+    try:
+        main_proc, main_port = start_main_server(backend, args.postgres_url, workdir, fake_env)
+        if "/send_json" in args.endpoints:
+            proxy_proc, proxy_port = start_proxy(main_port)
+
+        # Benchmark agent'larını kaydet (ölçülmez)
+        client = Client(main_port)
+        for i in range(args.agents):
+            status, _ = client.request("POST", "/agent_config", agent_config_body(i))
+            if status != 200:
+                raise RuntimeError(f"/agent_config kurulum isteği başarısız: {status}")
+
+        run_id = f"{backend}-{int(time.time())}"
+        results = {}
+        for endpoint in args.endpoints:
+            port = proxy_port if endpoint == "/send_json" else main_port
+            print(f"[{backend}] {endpoint} (eşzamanlılık {args.concurrency}, {args.requests} istek)...", file=sys.stderr)
+            results[endpoint] = run_phase(endpoint, port, main_port, args, run_id)
+
+        if "/chat" in results and "/send_json" in results:
+            results["send_json_overhead_ms"] = {
+                q: round(results["/send_json"]["latency_ms"][q] - results["/chat"]["latency_ms"][q], 3)
+                for q in ("p50", "p95", "p99")
+            }
+        return results
+    finally:
+        stop(proxy_proc)
+        stop(main_proc)
+
+
+# --------------------------------------------------
+# Baseline karşılaştırması
+# --------------------------------------------------
+def compare(report: dict, baseline: dict, max_regression: float) -> dict:
+    """
+    Her backend/endpoint için p95 gecikme ve rps değişim oranlarını hesaplar.
+
+    p95 artışı veya rps düşüşü `max_regression` oranını aşarsa `regression: true`.
+    """
+    comparison = {}
+    for backend, endpoints in report["results"].items():
+        base_endpoints = baseline.get("results", {}).get(backend, {})
+        for endpoint, cur in endpoints.items():
+            base = base_endpoints.get(endpoint)
+            if not isinstance(base, dict) or "latency_ms" not in base or "latency_ms" not in cur:
+                continue
+            p95_change = (cur["latency_ms"]["p95"] / base["latency_ms"]["p95"] - 1) if base["latency_ms"]["p95"] else 0.0
+            rps_change = (cur["rps"] / base["rps"] - 1) if base["rps"] else 0.0
+            comparison.setdefault(backend, {})[endpoint] = {
+                "p95_change": round(p95_change, 4),
+                "rps_change": round(rps_change, 4),
+                "db_queries_per_request_change": round(
+                    cur["db_queries_per_request"] - base.get("db_queries_per_request", 0.0), 3),
+                "regression": max_regression is not None and (p95_change > max_regression or rps_change < -max_regression),
+            }
+    return comparison
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT_DIR),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kremna benchmark (sahte Gemini ile)")
+    parser.add_argument("--backends", default="sqlite", help="Virgülle ayrılmış: sqlite,sqlite-untuned,postgres")
+    parser.add_argument("--postgres-url", default=os.getenv("BENCH_POSTGRES_URL", ""),
+                        help="postgres backend için bağlantı adresi (BENCH_POSTGRES_URL)")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="Endpoint başına ölçülen istek sayısı")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--turns-per-session", type=int, default=5)
+    parser.add_argument("--gemini-latency-ms", type=float, default=200.0)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--gemini-prompt-tokens", type=int, default=600)
+    parser.add_argument("--gemini-output-tokens", type=int, default=60)
+    parser.add_argument("--output", help="JSON raporun yazılacağı dosya (verilmezse stdout)")
+    parser.add_argument("--baseline", help="Karşılaştırılacak önceki JSON rapor")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="Baseline'a göre izin verilen en fazla kötüleşme oranı (ör. 0.15); aşılırsa çıkış kodu 1")
+    parser.add_argument("--keep-data", action="store_true", help="Geçici SQLite dosyalarını silme")
+    args = parser.parse_args()
+
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "postgres" in backends and not args.postgres_url:
+        parser.error("postgres backend için --postgres-url veya BENCH_POSTGRES_URL gerekli")
+
+    fake_env = {
+        "FAKE_GEMINI_LATENCY_MS": str(args.gemini_latency_ms),
+        "FAKE_GEMINI_JITTER_MS": str(args.gemini_jitter_ms),
+        "FAKE_GEMINI_PROMPT_TOKENS": str(args.gemini_prompt_tokens),
+        "FAKE_GEMINI_OUTPUT_TOKENS": str(args.gemini_output_tokens),
+    }
+
+    workdir = Path(tempfile.mkdtemp(prefix="kremna-bench-"))
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "warmup": args.warmup,
+            "agents": args.agents,
+            "fake_gemini": {
+                "latency_ms": args.gemini_latency_ms,
+                "jitter_ms": args.gemini_jitter_ms,
+                "prompt_tokens": args.gemini_prompt_tokens,
+                "output_tokens": args.gemini_output_tokens,
+            },
+        },
+        "results": {},
+    }
+    try:
+        for backend in backends:
+            report["results"][backend] = run_backend(backend, args, workdir, fake_env)
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(report, baseline, args.max_regression)
+        if any(entry["regression"] for endpoints in report["comparison"].values() for entry in endpoints.values()):
+            exit_code = 1
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Rapor yazıldı: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+main_receiver'ı sahte Gemini ve DB sorgu sayacı ile başlatır (sadece benchmark için)
+
+Kullanım (run_benchmark.py bunu alt süreç olarak çalıştırır):
+    python benchmark/serve_main.py --port 9100
+
+Ek endpoint:
+    GET /__bench__/counters -> {"db_queries": ..., "gemini_calls": ...}
+"""
+# YAZAN: DevOps & QA Engineer
+
+import argparse
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / "main"))
+
+import fake_gemini  # noqa: E402
+
+# Sadece veri sorguları sayılır (BEGIN/COMMIT/PRAGMA hariç)
+_QUERY_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+_lock = threading.Lock()
+_counters = {"db_queries": 0}
+
+
+def _count(sql):
+    if isinstance(sql, str) and sql.lstrip()[:6].upper().startswith(_QUERY_PREFIXES):
+        with _lock:
+            _counters["db_queries"] += 1
+
+
+def install_query_counter():
+    """sqlite3.connect ve psycopg2.connect'i sorgu sayan sürümlerle değiştirir."""
+    real_sqlite_connect = sqlite3.connect
+
+    def counting_sqlite_connect(*args, **kwargs):
+        conn = real_sqlite_connect(*args, **kwargs)
+        conn.set_trace_callback(_count)
+        return conn
+
+    sqlite3.connect = counting_sqlite_connect
+
+    try:
+        import psycopg2
+        import psycopg2.extensions
+    except ImportError:
+        return
+
+    class CountingCursor(psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            _count(query)
+            return super().execute(query, vars)
+
+        def executemany(self, query, vars_list):
+            _count(query)
+            return super().executemany(query, vars_list)
+
+    real_pg_connect = psycopg2.connect
+
+    def counting_pg_connect(*args, **kwargs):
+        kwargs.setdefault("cursor_factory", CountingCursor)
+        return real_pg_connect(*args, **kwargs)
+
+    psycopg2.connect = counting_pg_connect
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark için main_receiver sunucusu")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    fake_gemini.install()
+    install_query_counter()
+
+    import uvicorn
+    import main_receiver
+
+    @main_receiver.app.get("/__bench__/counters", include_in_schema=False)
+    def bench_counters():
+        with _lock:
+            queries = _counters["db_queries"]
+        return {"db_queries": queries, "gemini_calls": fake_gemini.CALLS["generate"]}
+
+    uvicorn.run(main_receiver.app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+SQLite eşzamanlı yazma benchmark'ı: varsayılan ayarlar vs ayarlı mod
+
+main_receiver'ın sohbet geçmişi yazma/okuma kalıbını (save_chat_message'daki
+INSERT ... SELECT MAX(seq) + 1 ve get_recent_history okuması) aynı şema ve
+indeksle, çok thread'li (ve istenirse çok süreçli, uvicorn worker'ları gibi)
+çalıştırır:
+
+- untuned: ayarlı moddan önceki davranış; havuzdaki bağlantılar varsayılan
+  `sqlite3.connect` ayarlarıyla (rollback journal, synchronous=FULL)
+- tuned:   main/sqlite_store.SQLiteStore (WAL, synchronous=NORMAL, thread
+  başına okuyucu, tek yazar, BEGIN IMMEDIATE, busy_timeout)
+
+Saniyedeki yazma, gecikme yüzdelikleri ve "database is locked" gibi hata
+sayıları JSON olarak raporlanır.
+
+Örnek:
+    python benchmark/sqlite_write_benchmark.py --threads 16 --turns 200
+    python benchmark/sqlite_write_benchmark.py --processes 4 --threads 8 --output sqlite_bench.json
+
+Sadece standart kütüphane kullanır.
+"""
+# YAZAN: DevOps & QA Engineer
+
+import argparse
+import json
+import multiprocessing
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / "main"))
+
+from db_pool import ConnectionPool  # noqa: E402
+from run_benchmark import percentile  # noqa: E402
+from sqlite_store import SQLiteStore  # noqa: E402
+
+MODES = ["untuned", "tuned"]
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        agent_id TEXT,
+        persona_id INTEGER,
+        role TEXT,
+        message TEXT,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        seq INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_chat_history_session_seq ON chat_history (session_id, agent_id, seq)",
+]
+
+INSERT_SQL = """
+    INSERT INTO chat_history (session_id, agent_id, role, message, timestamp, seq)
+    SELECT ?, ?, ?, ?, ?, COALESCE(MAX(seq), 0) + 1
+    FROM chat_history WHERE session_id = ? AND agent_id = ?
+"""
+
+SELECT_SQL = """
+    SELECT role, message FROM chat_history
+    WHERE session_id = ? AND agent_id = ?
+    ORDER BY seq DESC, id DESC
+    LIMIT 6
+"""
+
+MESSAGE = "Merhaba, ürünleriniz hakkında bilgi alabilir miyim? " * 4
+
+
+def make_connections(mode: str, path: str, threads: int):
+    """(okuma_bağlantısı_al, yazma_bağlantısı_al, kapat) üçlüsü."""
+    if mode == "tuned":
+        store = SQLiteStore(path)
+        return store.reader, store.writer, store.close
+    pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), min_size=1, max_size=threads,
+                          name="sqlite")
+    return pool.acquire, pool.acquire, pool.close_all
+
+
+def worker(get_reader, get_writer, session_id: str, turns: int, result: dict):
+    for _ in range(turns):
+        # Bir sohbet turu: geçmişi oku, kullanıcı + asistan mesajlarını yaz
+        started = time.perf_counter()
+        try:
+            conn = get_reader()
+            try:
+                conn.execute(SELECT_SQL, (session_id, "bench-agent")).fetchall()
+            finally:
+                conn.close()
+            result["read_ms"].append((time.perf_counter() - started) * 1000)
+        except sqlite3.Error as e:
+            result["errors"][str(e)] = result["errors"].get(str(e), 0) + 1
+
+        for role in ("user", "assistant"):
+            started = time.perf_counter()
+            try:
+                conn = get_writer()
+                try:
+                    conn.execute(INSERT_SQL, (session_id, "bench-agent", role, MESSAGE, datetime.now().isoformat(),
+                                              session_id, "bench-agent"))
+                    conn.commit()
+                finally:
+                    conn.close()
+                result["write_ms"].append((time.perf_counter() - started) * 1000)
+            except sqlite3.Error as e:
+                result["errors"][str(e)] = result["errors"].get(str(e), 0) + 1
+
+
+def run_process(mode: str, path: str, process_index: int, threads: int, turns: int, queue):
+    get_reader, get_writer, close = make_connections(mode, path, threads)
+    results = []
+    pool = []
+    for i in range(threads):
+        result = {"read_ms": [], "write_ms": [], "errors": {}}
+        results.append(result)
+        session_id = f"bench-{process_index}-{i}"
+        pool.append(threading.Thread(target=worker, args=(get_reader, get_writer, session_id, turns, result)))
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    close()
+    merged = {"read_ms": [], "write_ms": [], "errors": {}}
+    for result in results:
+        merged["read_ms"].extend(result["read_ms"])
+        merged["write_ms"].extend(result["write_ms"])
+        for key, count in result["errors"].items():
+            merged["errors"][key] = merged["errors"].get(key, 0) + count
+    queue.put(merged)
+
+
+def latency(values) -> dict:
+    values = sorted(values)
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def run_mode(mode: str, args, workdir: Path) -> dict:
+    path = str(workdir / f"{mode}.db")
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=run_process, args=(mode, path, p, args.threads, args.turns, queue))
+             for p in range(args.processes)]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    parts = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - started
+
+    write_ms = [v for part in parts for v in part["write_ms"]]
+    read_ms = [v for part in parts for v in part["read_ms"]]
+    errors = {}
+    for part in parts:
+        for key, count in part["errors"].items():
+            errors[key] = errors.get(key, 0) + count
+
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
+    conn.close()
+    return {
+        "writes": len(write_ms),
+        "reads": len(read_ms),
+        "rows_in_db": rows,
+        "errors": sum(errors.values()),
+        "error_messages": errors,
+        "elapsed_s": round(elapsed, 3),
+        "writes_per_sec": round(len(write_ms) / elapsed, 1) if elapsed else 0.0,
+        "write_latency_ms": latency(write_ms),
+        "read_latency_ms": latency(read_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite eşzamanlı yazma benchmark'ı (varsayılan vs ayarlı mod)")
+    parser.add_argument("--modes", default="untuned,tuned", help="Virgülle ayrılmış: untuned,tuned")
+    parser.add_argument("--processes", type=int, default=1, help="Süreç sayısı (uvicorn worker'ları gibi)")
+    parser.add_argument("--threads", type=int, default=16, help="Süreç başına eşzamanlı thread")
+    parser.add_argument("--turns", type=int, default=100, help="Thread başına sohbet turu (1 okuma + 2 yazma)")
+    parser.add_argument("--output", help="JSON raporun yazılacağı dosya (verilmezse stdout)")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"Bilinmeyen mod: {', '.join(unknown)}")
+
+    report = {
+        "meta": {
+            "processes": args.processes,
+            "threads": args.threads,
+            "turns": args.turns,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "results": {},
+    }
+    workdir = Path(tempfile.mkdtemp(prefix="kremna-sqlite-bench-"))
+    try:
+        for mode in modes:
+            print(f"[{mode}] {args.processes} süreç x {args.threads} thread x {args.turns} tur...", file=sys.stderr)
+            report["results"][mode] = run_mode(mode, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = report["results"]
+    if "untuned" in results and "tuned" in results and results["untuned"]["writes_per_sec"]:
+        report["speedup_writes_per_sec"] = round(
+            results["tuned"]["writes_per_sec"] / results["untuned"]["writes_per_sec"], 2)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Model çağrıları için kabul kontrolü (admission control)
+
+Ani yüklerde her /chat isteği doğrudan Gemini'ye gidiyor, kota hataları
+alınıyor ve kuyruklar sınırsız uzuyordu. Bu modül model çağrılarını
+global ve agent bazında eşzamanlılık sınırıyla korur:
+
+- Sınır doluysa istek sınırlı bir bekleme kuyruğuna girer (FIFO)
+- Kuyruk da doluysa veya bekleme süresi (deadline) aşılırsa istek hemen
+  reddedilir; çağıran 429/503 + Retry-After döner
+- Böylece kuyruk sınırsız büyümez, kuyruk gecikmesi öngörülebilir kalır
+
+Sadece event loop içinden kullanılır (kilit yok; await boyunca hiçbir şey tutulmaz).
+"""
+# YAZAN: Backend Developer & DevOps
+
+import asyncio
+import math
+import time
+from collections import deque
+
+
+class AdmissionRejected(Exception):
+    """
+    Args:
+        status_code: 429 (agent sınırı) veya 503 (genel aşırı yük)
+        retry_after: İstemcinin tekrar denemeden önce beklemesi önerilen süre (sn)
+        reason: "queue_full" veya "timeout"
+    """
+
+    def __init__(self, status_code: int, retry_after: int, reason: str, scope: str):
+        super().__init__(f"{scope} {reason}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+        self.scope = scope
+
+
+class _QueueFull(Exception):
+    pass
+
+
+class _Limiter:
+    """FIFO bekleme kuyruklu, sınırlı eşzamanlılık sayacı."""
+
+    __slots__ = ("limit", "max_waiters", "active", "_waiters")
+
+    def __init__(self, limit: int, max_waiters: int):
+        self.limit = limit
+        self.max_waiters = max_waiters
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self._waiters
+
+    async def acquire(self, timeout: float):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_waiters:
+            raise _QueueFull()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except BaseException:
+            # Slot tam o sırada devredildiyse geri ver; değilse kuyruktan çık
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self):
+        # Slot, bekleyen ilk isteğe doğrudan devredilir (active değişmez)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionSlot:
+    """Alınmış bir çağrı hakkı; release() birden fazla çağrılabilir."""
+
+    __slots__ = ("_controller", "_agent_key", "_released", "_started")
+
+    def __init__(self, controller, agent_key):
+        self._controller = controller
+        self._agent_key = agent_key
+        self._released = False
+        self._started = time.monotonic()
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self._agent_key, time.monotonic() - self._started)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    """
+    Args:
+        max_concurrency: Aynı anda en fazla model çağrısı (tüm agent'lar)
+        agent_max_concurrency: Agent başına varsayılan sınır (0 = sınırsız)
+        max_queue: Global bekleme kuyruğu uzunluğu
+        agent_max_queue: Agent başına bekleme kuyruğu uzunluğu
+        queue_timeout: Kuyrukta en fazla bekleme süresi (sn)
+        agent_limits: agent_id -> özel eşzamanlılık sınırı
+    """
+
+    def __init__(self, max_concurrency: int = 32, agent_max_concurrency: int = 0, max_queue: int = 64,
+                 agent_max_queue: int = 16, queue_timeout: float = 2.0, agent_limits: dict = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.agent_max_concurrency = max(0, agent_max_concurrency)
+        self.agent_max_queue = max(0, agent_max_queue)
+        self.queue_timeout = queue_timeout
+        self.agent_limits = dict(agent_limits or {})
+        self._global = _Limiter(self.max_concurrency, max(0, max_queue))
+        self._agents = {}
+        # Model çağrısı süresinin hareketli ortalaması (Retry-After tahmini için)
+        self._avg_call_seconds = 1.0
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def _agent_limit(self, agent_id) -> int:
+        return self.agent_limits.get(agent_id, self.agent_max_concurrency)
+
+    def _retry_after(self, limiter: _Limiter) -> int:
+        # Kuyruğun boşalması için gereken yaklaşık süre
+        estimate = self._avg_call_seconds * (limiter.waiting + 1) / max(1, limiter.limit)
+        return max(1, min(60, math.ceil(estimate)))
+
+    async def acquire(self, agent_id) -> AdmissionSlot:
+        """
+        Model çağrısı için hak alır.
+
+        Raises:
+            AdmissionRejected: Kuyruk dolu veya bekleme süresi aşıldı
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        agent_key = None
+        limit = self._agent_limit(agent_id)
+        if limit > 0:
+            agent_key = agent_id
+            limiter = self._agents.get(agent_key)
+            if limiter is None:
+                limiter = self._agents[agent_key] = _Limiter(limit, self.agent_max_queue)
+            try:
+                await self._enter(limiter, deadline, 429, "agent")
+            except BaseException:
+                if limiter.idle and self._agents.get(agent_key) is limiter:
+                    del self._agents[agent_key]
+                raise
+
+        try:
+            await self._enter(self._global, deadline, 503, "global")
+        except BaseException:
+            if agent_key is not None:
+                self._release_agent(agent_key)
+            raise
+
+        self._stats["admitted"] += 1
+        return AdmissionSlot(self, agent_key)
+
+    def slot(self, agent_id):
+        """`async with admission.slot(agent_id):` kullanımı için."""
+        return _SlotContext(self, agent_id)
+
+    async def _enter(self, limiter: _Limiter, deadline: float, status_code: int, scope: str):
+        queued = not (limiter.active < limiter.limit and not limiter.waiting)
+        if queued:
+            self._stats["queued"] += 1
+        try:
+            await limiter.acquire(max(0.0, deadline - time.monotonic()))
+        except _QueueFull:
+            self._stats["rejected_queue_full"] += 1
+            raise AdmissionRejected(status_code, self._retry_after(limiter), "queue_full", scope)
+        except asyncio.TimeoutError:
+            self._stats["rejected_timeout"] += 1
+            raise AdmissionRejected(status_code, self._retry_after(limiter), "timeout", scope)
+
+    def _release(self, agent_key, elapsed: float):
+        self._avg_call_seconds = 0.9 * self._avg_call_seconds + 0.1 * elapsed
+        self._global.release()
+        if agent_key is not None:
+            self._release_agent(agent_key)
+
+    def _release_agent(self, agent_key):
+        limiter = self._agents.get(agent_key)
+        if limiter is None:
+            return
+        limiter.release()
+        if limiter.idle:
+            # Boşta kalan agent sayaçları tutulmaz (bellek sınırlı kalsın)
+            del self._agents[agent_key]
+
+    def stats(self) -> dict:
+        data = dict(self._stats)
+        data.update({
+            "active": self._global.active,
+            "waiting": self._global.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self._global.max_waiters,
+            "queue_timeout_ms": round(self.queue_timeout * 1000, 3),
+            "agent_max_concurrency": self.agent_max_concurrency,
+            "agents_active": len(self._agents),
+            "avg_call_ms": round(self._avg_call_seconds * 1000, 3),
+        })
+        return data
+
+
+class _SlotContext:
+    __slots__ = ("_controller", "_agent_id", "_slot")
+
+    def __init__(self, controller, agent_id):
+        self._controller = controller
+        self._agent_id = agent_id
+        self._slot = None
+
+    async def __aenter__(self):
+        self._slot = await self._controller.acquire(self._agent_id)
+        return self._slot
+
+    async def __aexit__(self, *exc):
+        self._slot.release()
+        return False
@@ -0,0 +1,163 @@
+"""
+Oturum bazlı bellek içi sohbet halka tamponu
+
+Prompt için her turda geçmiş DB'den okunup yeniden sanitize ediliyordu.
+Canlı bir sohbette önceki turu genellikle aynı süreç işlemiştir; bu
+tampon (session_id, agent_id) başına son N sanitize edilmiş satırı sabit
+boyutlu bir halkada tutar. DB'ye sadece tamponda kayıt yoksa gidilir.
+
+Sınırlar: LRU tahliye, boşta kalma süresi (idle TTL) ve toplam bellek
+tavanı. Sadece event loop içinden kullanılmak üzere tasarlanmıştır (kilit yok).
+"""
+# YAZAN: Backend Developer
+
+import time
+from collections import OrderedDict, deque
+
+# Satır başına yaklaşık sabit bellek yükü (str nesnesi + deque hücresi)
+_LINE_OVERHEAD = 80
+_ENTRY_OVERHEAD = 400
+
+
+class _Entry:
+    __slots__ = ("lines", "omitted", "last_access", "size")
+
+    def __init__(self, lines, omitted, max_turns):
+        self.lines = deque(lines, maxlen=max_turns)
+        # Halkadan düşen (daha eski) satır sayısı
+        self.omitted = omitted + max(0, len(lines) - max_turns)
+        self.last_access = time.monotonic()
+        self.size = _ENTRY_OVERHEAD + sum(len(ln) + _LINE_OVERHEAD for ln in self.lines)
+
+
+class ConversationBuffer:
+    """
+    Args:
+        max_turns: Oturum başına tutulan satır (mesaj) sayısı
+        max_sessions: En fazla oturum sayısı (LRU)
+        idle_ttl: Bu süre boyunca dokunulmayan oturum düşer (sn)
+        max_bytes: Tüm tamponlar için yaklaşık bellek tavanı
+    """
+
+    def __init__(self, max_turns: int = 6, max_sessions: int = 10000, idle_ttl: float = 1800.0,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.max_turns = max(1, max_turns)
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # DB'den yüklenmekte olan anahtarlar: key -> [eşzamanlı_yükleme, bayat_mı]
+        self._loading = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key):
+        """
+        Returns:
+            (satırlar, atlanan_sayısı) veya tamponda yoksa None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        now = time.monotonic()
+        if now - entry.last_access > self.idle_ttl:
+            self._drop(key)
+            self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            return None
+        entry.last_access = now
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return list(entry.lines), entry.omitted
+
+    def begin_load(self, key):
+        """DB okuması başlamadan önce çağrılır (eşzamanlı yazmaları yakalamak için)."""
+        state = self._loading.get(key)
+        if state is None:
+            self._loading[key] = [1, False]
+        else:
+            state[0] += 1
+
+    def cancel_load(self, key):
+        """begin_load sonrası DB okuması başarısız olduysa çağrılır."""
+        state = self._loading.get(key)
+        if state is not None:
+            state[0] -= 1
+            if state[0] <= 0:
+                del self._loading[key]
+
+    def load(self, key, lines, omitted: int):
+        """
+        DB'den okunan sanitize satırlarla oturumu tampona koyar.
+
+        Okuma sırasında bu oturuma yeni mesaj eklendiyse okunan veri
+        bayattır; tampona konmaz (bir sonraki tur yine DB'den okur).
+        """
+        state = self._loading.get(key)
+        stale = False
+        if state is not None:
+            stale = state[1]
+            state[0] -= 1
+            if state[0] <= 0:
+                del self._loading[key]
+        if stale or key in self._entries:
+            return
+        entry = _Entry(lines, omitted, self.max_turns)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._enforce_limits()
+
+    def append(self, key, line: str):
+        """
+        Yeni bir mesaj satırını oturumun halkasına ekler (kalıcı yazma ile aynı yolda).
+
+        Oturum tamponda yoksa hiçbir şey yapmaz; ilk okumada DB'den yüklenir.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            state = self._loading.get(key)
+            if state is not None:
+                state[1] = True
+            return
+        if len(entry.lines) == entry.lines.maxlen:
+            dropped = entry.lines[0]
+            entry.size -= len(dropped) + _LINE_OVERHEAD
+            self._bytes -= len(dropped) + _LINE_OVERHEAD
+            entry.omitted += 1
+        entry.lines.append(line)
+        entry.size += len(line) + _LINE_OVERHEAD
+        self._bytes += len(line) + _LINE_OVERHEAD
+        entry.last_access = time.monotonic()
+        self._entries.move_to_end(key)
+        self._enforce_limits()
+
+    def invalidate(self, key):
+        if key in self._entries:
+            self._drop(key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _enforce_limits(self):
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            over = len(self._entries) > self.max_sessions or self._bytes > self.max_bytes
+            idle = now - entry.last_access > self.idle_ttl
+            if not over and not idle:
+                break
+            self._drop(key)
+            self._stats["expired" if idle and not over else "evictions"] += 1
+
+    def stats(self) -> dict:
+        data = dict(self._stats)
+        data.update({
+            "sessions": len(self._entries),
+            "approx_bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "max_turns": self.max_turns,
+        })
+        return data
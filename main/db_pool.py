@@ -0,0 +1,255 @@
+"""
+Veritabanı bağlantı havuzu
+
+Her yardımcı fonksiyonun kendi bağlantısını açıp kapatması yerine, süreç
+genelinde paylaşılan bir havuz kullanılır. Havuzdan alınan bağlantı
+`close()` çağrıldığında kapanmaz, havuza geri döner; böylece mevcut
+`conn = get_db_connection() ... conn.close()` kalıbı değişmeden çalışır.
+
+Hem PostgreSQL (psycopg2) hem SQLite (kalıcı bağlantı modu) için kullanılır.
+"""
+# YAZAN: DevOps & Backend Developer
+
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Havuzdan belirlenen süre içinde bağlantı alınamadı."""
+
+
+class PooledConnection:
+    """
+    Havuzdan alınmış bir bağlantıyı saran ince proxy.
+
+    Tüm öznitelikler (cursor, commit, rollback, execute...) gerçek
+    bağlantıya yönlendirilir; sadece close() bağlantıyı havuza iade eder.
+    """
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise RuntimeError("Bağlantı havuza iade edilmiş")
+        return getattr(conn, name)
+
+    def close(self):
+        # İki kez close() çağrılması güvenlidir
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def discard(self):
+        """Bağlantıyı bozuk kabul edip havuza geri koymadan kapatır."""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn, discard=True)
+
+
+def default_health_check(conn) -> bool:
+    """Bağlantı üzerinde `SELECT 1` çalıştırır; başarısızsa False döner."""
+    if getattr(conn, "closed", 0):
+        # psycopg2: closed != 0 ise bağlantı kapanmış
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+class ConnectionPool:
+    """
+    Thread-safe, min/max boyutlu bağlantı havuzu.
+
+    Args:
+        connect: Yeni ham bağlantı döndüren fonksiyon
+        min_size: Başlangıçta açılacak ve boşta tutulacak en az bağlantı
+        max_size: Aynı anda açık olabilecek en fazla bağlantı
+        timeout: Havuz doluyken bağlantı için beklenecek en uzun süre (sn)
+        health_check_interval: Bu süreden uzun boşta kalan bağlantı
+            verilmeden önce `SELECT 1` ile kontrol edilir (sn)
+        max_idle: Bu süreden uzun boşta kalan bağlantılar (min_size üstü) kapatılır (sn)
+        health_check: Bağlantının sağlıklı olup olmadığını dönen fonksiyon
+        name: İstatistiklerde görünen havuz adı
+    """
+
+    def __init__(self, connect, min_size: int = 1, max_size: int = 10, timeout: float = 10.0,
+                 health_check_interval: float = 30.0, max_idle: float = 300.0,
+                 health_check=default_health_check, name: str = "db"):
+        if max_size < 1:
+            raise ValueError("max_size en az 1 olmalı")
+        self.name = name
+        self._connect = connect
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_idle = max_idle
+        self._health_check = health_check
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, son_kullanim_zamani)
+        self._size = 0        # açık (boşta + kullanımda) bağlantı sayısı
+        self._in_use = 0
+        self._closed = False
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "wait_time_total_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    def warm(self):
+        """min_size kadar bağlantıyı önceden açar."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["connections_created"] += 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self) -> PooledConnection:
+        """
+        Havuzdan bir bağlantı alır.
+
+        Boşta bağlantı yoksa ve havuz doluysa en fazla `timeout` saniye bekler,
+        sonra PoolTimeout fırlatır.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            last_used = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError(f"'{self.name}' havuzu kapatılmış")
+                    if self._idle:
+                        # LIFO: en son kullanılan (en sıcak) bağlantıyı ver
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"'{self.name}' havuzundan {self.timeout:.1f} sn içinde bağlantı alınamadı "
+                            f"(max_size={self.max_size})"
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["connections_created"] += 1
+            else:
+                idle_for = time.monotonic() - last_used
+                if idle_for > self.max_idle and self._size > self.min_size:
+                    self._close_raw(conn)
+                    continue
+                if idle_for > self.health_check_interval and not self._health_check(conn):
+                    with self._cond:
+                        self._stats["health_check_failures"] += 1
+                    self._close_raw(conn)
+                    continue
+
+            with self._cond:
+                self._in_use += 1
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["wait_time_total_ms"] += (time.monotonic() - started) * 1000
+            return PooledConnection(self, conn)
+
+    def release(self, conn, discard: bool = False):
+        """Bağlantıyı havuza iade eder (PooledConnection.close() çağırır)."""
+        if not discard:
+            try:
+                # Commit edilmemiş işlemleri geri al: bağlantı temiz dönsün
+                conn.rollback()
+            except Exception:
+                discard = True
+        if getattr(conn, "closed", 0):
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if not discard and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._close_raw(conn)
+
+    def _close_raw(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Boştaki tüm bağlantıları kapatır; kullanımdakiler iade edilince kapanır."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_raw(conn)
+
+    def stats(self) -> dict:
+        """İzleme için havuz istatistiklerini döndürür."""
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                "name": self.name,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "timeout_s": self.timeout,
+            })
+        data["wait_time_total_ms"] = round(data["wait_time_total_ms"], 3)
+        return data
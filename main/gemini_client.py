@@ -0,0 +1,113 @@
+"""
+Gemini istemci yöneticisi
+
+Eskiden her /chat isteğinde genai.configure() ve genai.GenerativeModel()
+yeniden çağrılıyordu. genai.configure() SDK'nın önbelleğe aldığı
+istemcileri sıfırladığı için her istek yeni bir gRPC (HTTP/2) kanalı
+açıyordu. Bu modül yapılandırmayı bir kez yapar ve agent bazında
+yeniden kullanılabilir model nesneleri tutar; tüm istekler aynı sıcak
+bağlantıyı paylaşır.
+"""
+# YAZAN: Backend Developer & DevOps
+
+import google.generativeai as genai
+
+# Agent bazında geçersiz kılınabilen üretim ayarları
+GENERATION_KEYS = ("temperature", "max_output_tokens", "top_p", "top_k")
+
+
+class GeminiClientManager:
+    """
+    Gemini yapılandırmasını ve model nesnelerini süreç boyunca tutar.
+
+    Args:
+        default_model: Varsayılan model adı (ör. "models/gemini-2.5-flash")
+        default_generation_config: Tüm modellere uygulanacak üretim ayarları
+        agent_overrides: agent_id -> {"model": ..., "temperature": ..., ...}
+    """
+
+    def __init__(self, default_model: str, default_generation_config: dict = None, agent_overrides: dict = None):
+        self.default_model = default_model
+        self.default_generation_config = dict(default_generation_config or {})
+        self.agent_overrides = dict(agent_overrides or {})
+        self._configured = False
+        # (model_adı, üretim_ayarları) -> GenerativeModel; aynı ayarlı agent'lar aynı nesneyi paylaşır
+        self._models = {}
+        # agent_id -> GenerativeModel (sadece özel ayarı olan agent'lar)
+        self._agent_models = {}
+
+    @property
+    def configured(self) -> bool:
+        return self._configured
+
+    def configure(self, api_key: str) -> bool:
+        """
+        genai'yi yalnızca ilk çağrıda yapılandırır.
+
+        Returns:
+            Yapılandırma hazırsa True, API anahtarı yoksa False
+        """
+        if self._configured:
+            return True
+        if not api_key:
+            return False
+        genai.configure(api_key=api_key)
+        self._configured = True
+        return True
+
+    def warm(self):
+        """
+        Paylaşılan async istemciyi önceden oluşturur (event loop içinde çağrılmalı).
+
+        İlk kullanıcı isteği istemci kurulum maliyetini ödemez.
+        """
+        if not self._configured:
+            return
+        try:
+            from google.generativeai import client as genai_client
+            genai_client.get_default_generative_async_client()
+        except Exception:
+            pass
+        self.model_for(None)
+
+    def _build(self, model_name: str, generation_config: dict):
+        key = (model_name, tuple(sorted(generation_config.items())))
+        model = self._models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(model_name, generation_config=generation_config or None)
+            self._models[key] = model
+        return model
+
+    def model_for(self, agent_id: str = None):
+        """
+        Agent için yeniden kullanılabilir GenerativeModel nesnesini döner.
+
+        Özel ayarı olmayan tüm agent'lar varsayılan modeli paylaşır.
+        """
+        model = self._agent_models.get(agent_id)
+        if model is not None:
+            return model
+
+        spec = self.agent_overrides.get(agent_id) if agent_id is not None else None
+        if not spec:
+            return self._build(self.default_model, self.default_generation_config)
+
+        generation_config = dict(self.default_generation_config)
+        generation_config.update({k: spec[k] for k in GENERATION_KEYS if spec.get(k) is not None})
+        model = self._build(spec.get("model") or self.default_model, generation_config)
+        self._agent_models[agent_id] = model
+        return model
+
+    def model_named(self, model_name: str, generation_config: dict = None):
+        """Agent'tan bağımsız, adıyla belirtilen model (ör. özet için ucuz model)."""
+        config = dict(self.default_generation_config)
+        config.update(generation_config or {})
+        return self._build(model_name or self.default_model, config)
+
+    def stats(self) -> dict:
+        return {
+            "configured": self._configured,
+            "default_model": self.default_model,
+            "model_handles": len(self._models),
+            "agent_overrides": len(self.agent_overrides),
+        }
@@ -0,0 +1,135 @@
+"""
+Sıralı, eklenebilir güvenlik kontrol (guard) hattı
+
+Yasaklı konu kontrolü eskiden Gemini yanıtı geldikten sonra yapılıyordu;
+engellenecek bir mesaj için tam bir model çağrısının ücreti ödenip cevap
+çöpe atılıyordu. Bu modülde kontroller iki aşamalıdır:
+
+- pre: model çağrısından ÖNCE, sadece kullanıcı mesajına bakar. Engellerse
+  model hiç çağrılmaz (0 token, 0 upstream gecikme).
+- post: modelin çıktısına ihtiyaç duyan kontroller.
+
+Her aşama sırayla çalışır; ilk engelleyen aşama hazır bir cevapla hattı keser.
+Aşama bazında süre ve engelleme sayaçları tutulur.
+"""
+# YAZAN: Backend Developer & QA Engineer
+
+import time
+
+
+class GuardContext:
+    """Aşamalara verilen istek bağlamı."""
+
+    __slots__ = ("agent_config", "user_message", "scan", "answer")
+
+    def __init__(self, agent_config: dict, user_message: str, scan=None, answer: str = None):
+        self.agent_config = agent_config
+        self.user_message = user_message
+        self.scan = scan
+        self.answer = answer
+
+
+class GuardBlock:
+    """
+    Engelleme kararı.
+
+    Args:
+        stage: Engelleyen aşamanın adı (hattın doldurduğu alan)
+        reply: Kullanıcıya dönecek hazır cevap
+        topic: metadata.topic_detected değeri
+        persist: Tur sohbet geçmişine kaydedilsin mi
+    """
+
+    __slots__ = ("stage", "reply", "topic", "persist")
+
+    def __init__(self, reply: str, topic: str, persist: bool = True):
+        self.stage = None
+        self.reply = reply
+        self.topic = topic
+        self.persist = persist
+
+
+class _StageStats:
+    __slots__ = ("calls", "blocks", "errors", "total_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.blocks = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+
+class GuardPipeline:
+    """
+    Aşamalar `fn(ctx) -> GuardBlock | None` imzalı fonksiyonlardır.
+
+    Hata veren aşama engellemez (loglanır ve sayılır); güvenlik aşamalarının
+    kendi hatalarını kendileri ele alması beklenir.
+    """
+
+    def __init__(self):
+        self._stages = {"pre": [], "post": []}
+        self._stats = {}
+
+    def add(self, phase: str, name: str, fn):
+        """`phase` ("pre" / "post") sonuna yeni bir aşama ekler."""
+        if phase not in self._stages:
+            raise ValueError(f"Bilinmeyen guard aşaması: {phase}")
+        self._stages[phase].append((name, fn))
+        self._stats[(phase, name)] = _StageStats()
+
+    def pre(self, name: str):
+        """Model öncesi aşama eklemek için dekoratör."""
+        def register(fn):
+            self.add("pre", name, fn)
+            return fn
+        return register
+
+    def post(self, name: str):
+        """Model sonrası aşama eklemek için dekoratör."""
+        def register(fn):
+            self.add("post", name, fn)
+            return fn
+        return register
+
+    def run(self, phase: str, ctx: GuardContext):
+        """Aşamaları sırayla çalıştırır; ilk engelleme kararını (veya None) döner."""
+        for name, fn in self._stages[phase]:
+            stats = self._stats[(phase, name)]
+            stats.calls += 1
+            started = time.perf_counter()
+            try:
+                block = fn(ctx)
+            except Exception as e:
+                stats.errors += 1
+                print(f"UYARI: guard aşaması '{name}' hata verdi: {e}")
+                block = None
+            finally:
+                stats.total_seconds += time.perf_counter() - started
+            if block is not None:
+                stats.blocks += 1
+                block.stage = name
+                return block
+        return None
+
+    def run_pre(self, ctx: GuardContext):
+        return self.run("pre", ctx)
+
+    def run_post(self, ctx: GuardContext):
+        return self.run("post", ctx)
+
+    def stats(self) -> dict:
+        data = {}
+        for phase, stages in self._stages.items():
+            data[phase] = []
+            for name, _fn in stages:
+                st = self._stats[(phase, name)]
+                data[phase].append({
+                    "stage": name,
+                    "calls": st.calls,
+                    "blocks": st.blocks,
+                    "errors": st.errors,
+                    "total_ms": round(st.total_seconds * 1000, 3),
+                    "avg_us": round(st.total_seconds * 1e6 / st.calls, 2) if st.calls else 0.0,
+                })
+        return data
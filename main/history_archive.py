@@ -0,0 +1,240 @@
+"""
+Eski sohbet geçmişinin sıkıştırılmış arşiv segmentlerine taşınması
+
+chat_history tablosu sadece büyüyordu; hiçbir satır silinmiyor veya
+arşivlenmiyordu. Bu modül soğuk satırları yerel diskte agent ve gün başına
+bir dosyaya (`<kök>/<agent>/<YYYY-MM-DD>.ndjson.gz`) ekler:
+
+- Segmentler sadece sona eklenir: her parti ayrı bir gzip üyesi olarak
+  tek `write` ile yazılır ve fsync edilir; gzip okuyucuları ardışık üyeleri
+  tek akış olarak okur. Satırlar DB'den ancak fsync'ten sonra silinir.
+- Çökme sonrası aynı parti tekrar yazılabilir; okuyucu bir segmentte daha
+  önce görülen id'leri (id'ler artan sırada yazılır) atlar.
+- Yarım kalmış son üye (ör. disk doldu) okunabilen kısma kadar okunur.
+
+RetentionJob arka planda küçük partilerle çalışır; her parti kısa bir
+transaction'dır ve partiler arasında beklenir, sıcak yol meşgul edilmez.
+
+Okuyucu komut satırından da kullanılabilir:
+    python history_archive.py <arşiv_kökü> [agent_id] [ilk_gün] [son_gün]
+"""
+# YAZAN: Backend Developer & DevOps
+
+import asyncio
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+try:
+    import fcntl   # Windows'ta yok: süreçler arası kilit atlanır
+except ImportError:
+    fcntl = None
+
+SEGMENT_SUFFIX = ".ndjson.gz"
+_DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def agent_dir_name(agent_id: str) -> str:
+    # "/" ve ".." gibi değerler dizin dışına çıkamasın
+    return quote(str(agent_id), safe="").replace(".", "%2E") or "%00"
+
+
+def segment_day(timestamp) -> str:
+    """Satırın zaman damgasından segment günü (YYYY-MM-DD)."""
+    if hasattr(timestamp, "strftime"):
+        return timestamp.strftime("%Y-%m-%d")
+    day = str(timestamp or "")[:10]
+    return day if _DAY_RE.match(day) else "undated"
+
+
+def segment_path(root, agent_id: str, day: str) -> Path:
+    return Path(root) / agent_dir_name(agent_id) / f"{day}{SEGMENT_SUFFIX}"
+
+
+def append_segment(path: Path, records) -> int:
+    """
+    Kayıtları (dict) segmentin sonuna yeni bir gzip üyesi olarak ekler ve diske yazar.
+
+    Returns:
+        Eklenen bayt sayısı
+    """
+    payload = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+    data = gzip.compress(payload.encode("utf-8"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        start = os.fstat(fd).st_size
+        try:
+            written = os.write(fd, data)
+            if written != len(data):
+                raise OSError(f"{path}: kısa yazma ({written}/{len(data)})")
+            os.fsync(fd)
+        except OSError:
+            # Yarım üye sonraki partileri okunamaz yapmasın
+            os.ftruncate(fd, start)
+            raise
+    finally:
+        os.close(fd)
+    return len(data)
+
+
+def iter_segment(path):
+    """Segmentteki kayıtları yazıldıkları sırayla döner (tekrar yazılmış id'ler atlanır)."""
+    last_id = None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record_id = record.get("id")
+                if isinstance(record_id, int):
+                    if last_id is not None and record_id <= last_id:
+                        continue
+                    last_id = record_id
+                yield record
+    except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+        print(f"UYARI: {path} sonu okunamadı ({e}); okunabilen kısım döndü")
+
+
+def list_segments(root, agent_id: str = None, first_day: str = None, last_day: str = None):
+    """[(agent_id, gün, yol), ...] agent ve gün sırasıyla."""
+    root = Path(root)
+    if agent_id is not None:
+        agent_dirs = [root / agent_dir_name(agent_id)]
+    else:
+        agent_dirs = sorted(p for p in root.iterdir() if p.is_dir()) if root.is_dir() else []
+    segments = []
+    for agent_dir in agent_dirs:
+        if not agent_dir.is_dir():
+            continue
+        for path in sorted(agent_dir.glob(f"*{SEGMENT_SUFFIX}")):
+            day = path.name[:-len(SEGMENT_SUFFIX)]
+            if _DAY_RE.match(day) and ((first_day and day < first_day) or (last_day and day > last_day)):
+                continue
+            segments.append((unquote(agent_dir.name), day, path))
+    return segments
+
+
+def iter_archive(root, agent_id: str = None, first_day: str = None, last_day: str = None):
+    """Arşivdeki kayıtları agent ve gün sırasıyla akış halinde döner (bellek segment boyutundan bağımsız)."""
+    for _, _, path in list_segments(root, agent_id, first_day, last_day):
+        yield from iter_segment(path)
+
+
+class RetentionJob:
+    """
+    Args:
+        list_agents: Geçmişi olan agent_id'leri döndüren async fonksiyon
+        policy_for: agent_id -> politika (dict) veya None (saklama sınırsız)
+        archive_batch: (agent_id, politika, limit) -> taşınan satır sayısı (async)
+        interval: Turlar arası bekleme (sn)
+        batch_size: Parti başına en fazla satır
+        pause: Partiler arası bekleme (sn); sıcak yola nefes aldırır
+        lock_path: Aynı makinedeki worker'lardan sadece biri çalışsın diye kilit dosyası
+    """
+
+    def __init__(self, list_agents, policy_for, archive_batch, interval: float = 300.0, batch_size: int = 500,
+                 pause: float = 0.05, lock_path=None):
+        self._list_agents = list_agents
+        self._policy_for = policy_for
+        self._archive_batch = archive_batch
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._running = False
+        self._task = None
+        self._stats = {"runs": 0, "batches": 0, "archived_rows": 0, "errors": 0, "skipped_locked": 0,
+                       "last_run_at": None, "last_error": None}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._release_lock()
+
+    async def _run(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def _acquire_lock(self) -> bool:
+        if fcntl is None or self.lock_path is None or self._lock_file is not None:
+            return True
+        Path(self.lock_path).parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Kilit süreç boyunca tutulur; bu worker arşivleyici olarak kalır
+        self._lock_file = lock_file
+        return True
+
+    def _release_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def run_once(self) -> int:
+        """Politikası olan her agent için birikmiş satırları partiler halinde taşır."""
+        # Aynı satırlar iki kez taşınmasın: süreç içinde tek tur, süreçler arası dosya kilidi
+        if self._running or not self._acquire_lock():
+            self._stats["skipped_locked"] += 1
+            return 0
+        self._running = True
+        moved_total = 0
+        try:
+            for agent_id in await self._list_agents():
+                policy = self._policy_for(agent_id)
+                if not policy:
+                    continue
+                while True:
+                    moved = await self._archive_batch(agent_id, policy, self.batch_size)
+                    if moved:
+                        self._stats["batches"] += 1
+                        self._stats["archived_rows"] += moved
+                        moved_total += moved
+                    if moved < self.batch_size:
+                        break
+                    await asyncio.sleep(self.pause)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Sonraki turda kaldığı yerden devam eder (silinmeyen satırlar yerinde durur)
+            self._stats["errors"] += 1
+            self._stats["last_error"] = str(e)
+        finally:
+            self._running = False
+        self._stats["runs"] += 1
+        self._stats["last_run_at"] = time.time()
+        return moved_total
+
+    def stats(self) -> dict:
+        data = dict(self._stats)
+        data.update({"running": self._task is not None and not self._task.done(),
+                     "interval": self.interval, "batch_size": self.batch_size})
+        return data
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    args = sys.argv[1:] + [None] * 3
+    for record in iter_archive(args[0], args[1] or None, args[2], args[3]):
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
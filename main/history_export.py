@@ -0,0 +1,151 @@
+"""
+Sohbet geçmişini akış halinde dışa aktarma (NDJSON / CSV)
+
+Analitik ekibi geçmişi doğrudan üretim veritabanından sorguluyordu;
+uygulama içinde ise get_chat_history tüm sonucu listeye dolduruyordu.
+Bu modül satırları parça parça okur ve hemen yazar; bellek kullanımı
+dışa aktarılan satır sayısından bağımsızdır.
+
+- PostgreSQL: sunucu tarafı (named) cursor + fetchmany
+- SQLite: fetchmany ile parça parça okuma
+- Arşiv segmentleri (history_archive): üreteç kendi thread'inde tüketilir
+
+Her dışa aktarma kendi bağlantısını ve tek thread'lik executor'ünü kullanır;
+sohbet isteklerinin DB havuzu ve thread havuzu meşgul edilmez. Executor
+`chunks()` tüketilmeye başlandığında kurulur (hiç okunmayan yanıt thread
+bırakmaz). Parçalar istemci okudukça çekilir (yavaş istemci sunucu
+belleğini doldurmaz).
+"""
+# YAZAN: Backend Developer & DevOps
+
+import asyncio
+import csv
+import io
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+
+class ChunkedQuery:
+    """
+    Args:
+        open_connection: Yeni bir ham DB bağlantısı açan fonksiyon (havuz dışı)
+        sql: Çalıştırılacak SELECT
+        params: Sorgu parametreleri
+        server_side: True ise PostgreSQL named cursor kullanılır
+        chunk_size: fetchmany parça boyutu
+    """
+
+    def __init__(self, open_connection, sql: str, params=(), server_side: bool = False, chunk_size: int = 1000):
+        self._open_connection = open_connection
+        self.sql = sql
+        self.params = tuple(params)
+        self.server_side = server_side
+        self.chunk_size = max(1, chunk_size)
+        self._conn = None
+        self._cursor = None
+
+    def _start(self):
+        self._conn = self._open_connection()
+        if self.server_side:
+            self._cursor = self._conn.cursor(name=f"export_{uuid.uuid4().hex}")
+            self._cursor.itersize = self.chunk_size
+        else:
+            self._cursor = self._conn.cursor()
+        self._cursor.execute(self.sql, self.params)
+
+    def _fetch(self):
+        return self._cursor.fetchmany(self.chunk_size)
+
+    def _close(self):
+        try:
+            if self._cursor is not None:
+                self._cursor.close()
+        except Exception:
+            pass
+        try:
+            if self._conn is not None:
+                # Sadece okuma yapıldı; açık transaction geri alınır
+                self._conn.rollback()
+                self._conn.close()
+        except Exception:
+            pass
+
+    async def chunks(self):
+        """Satır parçalarını (liste) sırayla üretir; sonunda bağlantıyı kapatır."""
+        loop = asyncio.get_running_loop()
+        # Bağlantı ve cursor hep aynı thread'de kullanılır
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        try:
+            await loop.run_in_executor(executor, self._start)
+            while True:
+                rows = await loop.run_in_executor(executor, self._fetch)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            try:
+                await asyncio.shield(loop.run_in_executor(executor, self._close))
+            finally:
+                executor.shutdown(wait=False)
+
+
+class ChunkedIterator:
+    """
+    Senkron bir satır üretecini (ör. arşiv okuyucu) kendi thread'inde
+    parça parça tüketir; ChunkedQuery ile aynı `chunks()` arayüzü.
+
+    Args:
+        make_iterator: Satır (tuple) üreten iterator'ı oluşturan fonksiyon
+    """
+
+    def __init__(self, make_iterator, chunk_size: int = 1000):
+        self._make_iterator = make_iterator
+        self.chunk_size = max(1, chunk_size)
+        self._iterator = None
+
+    def _fetch(self):
+        if self._iterator is None:
+            self._iterator = iter(self._make_iterator())
+        return list(islice(self._iterator, self.chunk_size))
+
+    def _close(self):
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            close()
+
+    async def chunks(self):
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        try:
+            while True:
+                rows = await loop.run_in_executor(executor, self._fetch)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            try:
+                await asyncio.shield(loop.run_in_executor(executor, self._close))
+            finally:
+                executor.shutdown(wait=False)
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def ndjson_chunk(columns, rows) -> str:
+    return "".join(
+        json.dumps({c: _value(v) for c, v in zip(columns, row)}, ensure_ascii=False) + "\n" for row in rows
+    )
+
+
+def csv_chunk(columns, rows, header: bool = False) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([[_value(v) for v in row] for row in rows])
+    return buf.getvalue()
@@ -0,0 +1,193 @@
+"""
+Write-behind sohbet geçmişi yazıcısı
+
+/chat yanıtı dönmeden önce her mesaj için ayrı bağlantı + INSERT + COMMIT
+yapılıyordu. Bu modül mesajları bellekte kuyruğa alır, hemen döner ve
+arka planda boyut/zaman eşiğine göre toplu (executemany) transaction'larla
+veritabanına yazar.
+
+Tutarlılık: Bir oturumun kuyrukta bekleyen mesajı varken o oturumun
+geçmişi okunacaksa `wait_flushed()` ilgili satırlar commit edilene kadar
+bekler (ve yazmayı hemen tetikler). Kapanışta kuyruk tamamen boşaltılır.
+"""
+# YAZAN: Backend Developer & DevOps
+
+import asyncio
+from collections import deque
+
+
+class HistoryWriter:
+    """
+    Args:
+        flush_batch: Satır listesini tek transaction'da yazan async fonksiyon
+        batch_size: Bu kadar satır birikince beklemeden yazılır
+        flush_interval: İlk satır geldikten sonra en fazla bu kadar beklenir (sn)
+        max_pending: Kuyruk sınırı; doluysa submit() False döner (çağıran doğrudan yazar)
+        retry_interval: Yazma hatasında tekrar denemeden önce beklenecek süre (sn)
+        shutdown_retries: Kapanışta hata durumunda en fazla deneme sayısı
+    """
+
+    def __init__(self, flush_batch, batch_size: int = 200, flush_interval: float = 0.05,
+                 max_pending: int = 10000, retry_interval: float = 1.0, shutdown_retries: int = 3):
+        self._flush_batch = flush_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self.shutdown_retries = shutdown_retries
+
+        self._queue = deque()        # (key, row)
+        self._pending_keys = {}      # key -> kuyruktaki satır sayısı
+        self._task = None
+        self._closing = False
+        self._has_data = None
+        self._flush_now = None
+        self._flushed = None
+
+        self._stats = {
+            "enqueued_rows": 0,
+            "flushed_rows": 0,
+            "flush_batches": 0,
+            "flush_errors": 0,
+            "rejected_rows": 0,
+            "dropped_rows": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._closing
+
+    def start(self):
+        """Arka plan yazma görevini başlatır (event loop içinde çağrılmalı)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._closing = False
+        self._has_data = asyncio.Event()
+        self._flush_now = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, key, rows) -> bool:
+        """
+        Satırları kuyruğa ekler ve hemen döner.
+
+        Returns:
+            Kuyruğa alındıysa True; yazıcı çalışmıyorsa veya kuyruk doluysa False
+        """
+        if not self.running or len(self._queue) + len(rows) > self.max_pending:
+            self._stats["rejected_rows"] += len(rows)
+            return False
+        for row in rows:
+            self._queue.append((key, row))
+        self._pending_keys[key] = self._pending_keys.get(key, 0) + len(rows)
+        self._stats["enqueued_rows"] += len(rows)
+        self._has_data.set()
+        if len(self._queue) >= self.batch_size:
+            self._flush_now.set()
+        return True
+
+    def has_pending(self, key) -> bool:
+        return key in self._pending_keys
+
+    async def wait_flushed(self, key, timeout: float = 2.0) -> bool:
+        """
+        `key` için kuyruktaki tüm satırlar commit edilene kadar bekler.
+
+        Returns:
+            Bekleyen satır kalmadıysa True, zaman aşımında False
+        """
+        if key not in self._pending_keys or self._flushed is None:
+            return True
+        self._flush_now.set()
+        try:
+            async with self._flushed:
+                await asyncio.wait_for(
+                    self._flushed.wait_for(lambda: key not in self._pending_keys),
+                    timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self):
+        """Yeni satır kabul etmeyi bırakır ve kuyruğu tamamen boşaltır."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._has_data.set()
+        self._flush_now.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await self._has_data.wait()
+            if not self._queue:
+                self._has_data.clear()
+                if self._closing:
+                    return
+                continue
+
+            # Zaman eşiği: batch dolmadıysa kısa bir süre daha biriktir
+            if len(self._queue) < self.batch_size and not self._closing:
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._flush_now.clear()
+
+            await self._drain()
+            if not self._queue:
+                self._has_data.clear()
+                if self._closing:
+                    return
+
+    async def _drain(self):
+        failures = 0
+        while self._queue:
+            n = min(self.batch_size, len(self._queue))
+            batch = [self._queue[i] for i in range(n)]
+            try:
+                await self._flush_batch([row for _, row in batch])
+            except Exception as e:
+                self._stats["flush_errors"] += 1
+                failures += 1
+                print(f"UYARI: chat_history toplu yazma hatası ({len(batch)} satır): {e}")
+                if self._closing and failures >= self.shutdown_retries:
+                    # Kapanışta sonsuza kadar bekleyemeyiz; kaybı açıkça logla
+                    self._stats["dropped_rows"] += len(self._queue)
+                    print(f"HATA: kapanışta {len(self._queue)} chat_history satırı yazılamadı")
+                    self._queue.clear()
+                    self._pending_keys.clear()
+                    await self._notify_flushed()
+                    return
+                await asyncio.sleep(self.retry_interval)
+                continue
+
+            failures = 0
+            # Satırlar ancak commit sonrası kuyruktan çıkar
+            for _ in range(n):
+                key, _row = self._queue.popleft()
+                left = self._pending_keys.get(key, 0) - 1
+                if left > 0:
+                    self._pending_keys[key] = left
+                else:
+                    self._pending_keys.pop(key, None)
+            self._stats["flushed_rows"] += n
+            self._stats["flush_batches"] += 1
+            await self._notify_flushed()
+
+    async def _notify_flushed(self):
+        async with self._flushed:
+            self._flushed.notify_all()
+
+    def stats(self) -> dict:
+        data = dict(self._stats)
+        data.update({
+            "running": self.running,
+            "pending_rows": len(self._queue),
+            "pending_sessions": len(self._pending_keys),
+            "batch_size": self.batch_size,
+            "flush_interval_ms": round(self.flush_interval * 1000, 3),
+        })
+        return data
@@ -0,0 +1,30 @@
+"""
+Hızlı JSON kodlama (bayt olarak)
+
+Önceden serileştirilip önbellekte tutulan yanıt gövdeleri için kullanılır.
+orjson kuruluysa onunla, değilse standart json ile kodlanır; çıktı her iki
+durumda da UTF-8 (ASCII kaçışsız) ve boşluksuzdur.
+"""
+# YAZAN: Backend Developer
+
+import json
+
+try:
+    import orjson   # opsiyonel: yoksa standart json kullanılır
+except ImportError:
+    orjson = None
+
+ENCODER = "orjson" if orjson is not None else "json"
+
+
+def _default(value):
+    # datetime vb. (PostgreSQL TIMESTAMP) -> ISO metin
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"JSON'a çevrilemeyen tip: {type(value).__name__}")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
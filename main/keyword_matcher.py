@@ -0,0 +1,95 @@
+"""
+Derlenmiş çoklu anahtar kelime eşleyici (Aho-Corasick)
+
+/chat her mesajda üç ayrı doğrusal tarama yapıyordu (injection kelimeleri,
+yasaklı konular, konu tespiti) ve mesajı her seferinde yeniden küçük harfe
+çeviriyordu. Bu modül tüm kelime gruplarını tek bir otomatta birleştirir;
+mesaj bir kez normalize edilir ve tek geçişte taranır. Tarama maliyeti
+kelime sayısından bağımsızdır (yüzlerce yasaklı konu olsa da mesaj uzunluğu
+kadar adım).
+
+Eşleşme, eski `k in mesaj.lower()` davranışı gibi alt metin (substring) bazlıdır.
+"""
+# YAZAN: Backend Developer & QA Engineer
+
+from collections import deque
+
+# Türkçe büyük/küçük harf katlama: "İ".lower() Python'da "i̇" (i + birleşik nokta)
+# verir ve "fiyat" ile eşleşmez. Ayrıca klavyeden "FIYAT" / "fıyat" yazımları da
+# yakalansın diye ı/I/İ hepsi "i"ye katlanır (anahtar kelime eşleşmesi için yeterli).
+_TR_FOLD = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+
+
+def fold_text(text: str) -> str:
+    """Metni eşleşme için Türkçe uyumlu biçimde küçük harfe katlar."""
+    return (text or "").translate(_TR_FOLD).lower()
+
+
+class KeywordMatcher:
+    """
+    Etiketli kelime gruplarından tek bir Aho-Corasick otomatı kurar.
+
+    Args:
+        groups: (etiket, kelimeler) çiftleri; ör. [("injection", [...]), ("fiyat_itirazi", [...])]
+    """
+
+    __slots__ = ("_goto", "_fail", "_out", "pattern_count")
+
+    def __init__(self, groups):
+        self._goto = [{}]
+        self._out = [set()]
+        self.pattern_count = 0
+
+        for label, keywords in groups:
+            for keyword in keywords:
+                keyword = fold_text(keyword).strip()
+                if not keyword:
+                    continue
+                state = 0
+                for ch in keyword:
+                    nxt = self._goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto.append({})
+                        self._out.append(set())
+                        self._goto[state][ch] = nxt
+                    state = nxt
+                self._out[state].add(label)
+                self.pattern_count += 1
+
+        # Hata (fail) bağlantıları: BFS ile; çıktı kümeleri fail zinciri boyunca birleştirilir
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+        self._out = [frozenset(labels) for labels in self._out]
+
+    def labels(self, folded_text: str) -> set:
+        """
+        Önceden `fold_text` ile katlanmış metinde eşleşen etiketleri döner.
+
+        Tek geçiş; her karakter için ortalama sabit sayıda sözlük erişimi.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in folded_text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+    def match(self, text: str) -> set:
+        """Ham metni katlayıp eşleşen etiketleri döner."""
+        return self.labels(fold_text(text))
@@ -0,0 +1,270 @@
+"""
+Prometheus metin formatında hafif metrik kaydı
+
+Yavaş bir /chat isteğinin zamanını nerede harcadığını (konfig, geçmiş,
+prompt, Gemini, kaydetme) görebilmek için aşama bazında histogramlar ve
+sayaçlar tutar; `/metrics` bu kaydı Prometheus exposition formatında döner.
+
+Sıcak yol maliyeti düşük tutulur:
+- Etiket kümeleri önceden bağlanır (`labels(...)` bir kez çağrılıp saklanır)
+- Güncellemede tutulan kilit sadece birkaç toplama sürer; await boyunca kilit tutulmaz
+- Havuz, önbellek, guard gibi zaten sayaç tutan bileşenler sadece
+  scrape anında okunur (callback metrikleri)
+"""
+# YAZAN: DevOps & Backend Developer
+
+import threading
+import time
+from bisect import bisect_left
+
+# Saniye cinsinden varsayılan histogram kovaları (DB ~ms, Gemini ~sn)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "_counts", "_sum", "_lock")
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)   # son hücre: +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def time(self):
+        """`with child.time():` bloğunun süresini gözlemler."""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """Etiket değerlerine bağlı alt metriği döner (sonucu saklayıp tekrar kullanın)."""
+        if kwargs:
+            values = tuple(kwargs[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: {len(self.labelnames)} etiket bekleniyordu")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self):
+        lines = self._header()
+        for key, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = self._header()
+        bounds = self.buckets + (float("inf"),)
+        for key, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Değeri scrape anında bir fonksiyondan okunan metrik (gauge veya counter).
+
+    fn() -> [(etiket_değerleri_tuple, değer), ...]
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames, fn):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._fn = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = self._fn() or []
+        except Exception as e:
+            return lines + [f"# {self.name} okunamadı: {_escape(e)}"]
+        for values, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, kind: str, labelnames, fn) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, kind, labelnames, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    Saf ASGI middleware: endpoint (route şablonu), method ve durum koduna göre
+    istek sayısı ve süresi. Route şablonu kullanıldığı için /agents/{agent_id}
+    gibi yollar etiket sayısını patlatmaz.
+    """
+
+    def __init__(self, app, requests_total: Counter, request_seconds: Histogram):
+        self.app = app
+        self.requests_total = requests_total
+        self.request_seconds = request_seconds
+        self._route_paths = None
+        self._bound = {}
+
+    def _endpoint_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "other"
+        if self._route_paths is None:
+            routes = scope["app"].routes
+            self._route_paths = {getattr(r, "endpoint", None): r.path for r in routes if hasattr(r, "endpoint")}
+        return self._route_paths.get(endpoint, "other")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            endpoint = self._endpoint_label(scope)
+            key = (endpoint, scope["method"], status_holder[0])
+            children = self._bound.get(key)
+            if children is None:
+                children = (self.requests_total.labels(*key), self.request_seconds.labels(endpoint))
+                self._bound[key] = children
+            children[0].inc()
+            children[1].observe(elapsed)
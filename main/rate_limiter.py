@@ -0,0 +1,188 @@
+"""
+Token-bucket hız sınırlayıcı (oturum, agent ve istemci IP'si bazında)
+
+/chat'te hiç hız sınırı yoktu; tek bir kötü niyetli oturum tüm Gemini
+kotasını ve DB yazma kapasitesini tüketebiliyordu. Her anahtar için bir
+kova tutulur: kova `burst` token alır, saniyede `rate` token dolar, her
+istek 1 token harcar. Bir istekte birden fazla kova (IP + agent + oturum)
+birlikte kontrol edilir; biri bile boşsa hiçbirinden token düşülmez.
+
+İki backend:
+- MemoryRateLimiter: süreç içi, kontrol birkaç mikrosaniye
+- SQLiteRateLimiter: aynı makinedeki tüm uvicorn worker'larının paylaştığı
+  SQLite dosyası (WAL, synchronous=OFF; kalıcılık gerekmez)
+
+Kontroller DB ve model işlerinden önce yapılmak üzere tasarlanmıştır.
+"""
+# YAZAN: Backend Developer & DevOps
+
+import math
+import sqlite3
+import threading
+import time
+
+
+class RateLimitExceeded:
+    """Reddedilen kontrolün sonucu: hangi kova ve ne kadar beklenmeli."""
+
+    __slots__ = ("scope", "retry_after")
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after))
+
+
+def _refill(tokens: float, last: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + (now - last) * rate)
+
+
+class MemoryRateLimiter:
+    """
+    Süreç içi token-bucket.
+
+    Args:
+        max_keys: Bellekte tutulan en fazla kova; aşılınca dolu (eşdeğeri
+            yeni kova olan) kovalar, gerekirse en eskiler atılır
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = {}   # key -> [tokens, last, rate, burst]
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "limited": 0}
+
+    def check(self, limits):
+        """
+        limits: [(scope, key, rate_per_sec, burst), ...]
+
+        Returns:
+            None (izin verildi, token düşüldü) veya RateLimitExceeded
+        """
+        now = time.monotonic()
+        with self._lock:
+            states = []
+            for scope, key, rate, burst in limits:
+                bucket = self._buckets.get(key)
+                tokens = burst if bucket is None else _refill(bucket[0], bucket[1], now, rate, burst)
+                if tokens < 1.0:
+                    self._stats["limited"] += 1
+                    return RateLimitExceeded(scope, (1.0 - tokens) / rate)
+                states.append((key, tokens, rate, burst))
+            for key, tokens, rate, burst in states:
+                self._buckets[key] = [tokens - 1.0, now, rate, burst]
+            self._stats["allowed"] += 1
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return None
+
+    def _prune(self, now: float):
+        # Dolmuş kovalar yeni kovayla aynıdır; silmek davranışı değiştirmez
+        full = [k for k, (tokens, last, rate, burst) in self._buckets.items()
+                if _refill(tokens, last, now, rate, burst) >= burst]
+        for key in full:
+            del self._buckets[key]
+        overflow = len(self._buckets) - self.max_keys
+        if overflow > 0:
+            for key in list(self._buckets)[:overflow]:
+                del self._buckets[key]
+
+    def stats(self) -> dict:
+        data = dict(self._stats)
+        data.update({"backend": "memory", "buckets": len(self._buckets), "max_keys": self.max_keys})
+        return data
+
+
+class SQLiteRateLimiter:
+    """
+    Aynı makinedeki worker'lar arasında paylaşılan token-bucket.
+
+    Her kontrol tek bir kısa `BEGIN IMMEDIATE` transaction'ıdır. Dosya
+    kilitliyse `busy_timeout` kadar beklenir; yine alınamazsa istek
+    engellenmez (fail-open) ve sayılır.
+
+    Bloklayıcıdır; async kod içinden ayrı bir thread havuzunda çağrılmalıdır.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, busy_timeout_ms: int = 50, prune_every: int = 1000):
+        self.path = path
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._checks = 0
+        self._stats = {"allowed": 0, "limited": 0, "busy_fail_open": 0}
+        self.busy_timeout_ms = busy_timeout_ms
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                bucket_key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transaction'ları elle yönetiyoruz
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def check(self, limits):
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            with self._lock:
+                self._stats["busy_fail_open"] += 1
+            return None
+        try:
+            updates = []
+            for scope, key, rate, burst in limits:
+                row = conn.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = ?",
+                                   (key,)).fetchone()
+                tokens = burst if row is None else _refill(row[0], row[1], now, rate, burst)
+                if tokens < 1.0:
+                    conn.execute("ROLLBACK")
+                    with self._lock:
+                        self._stats["limited"] += 1
+                    return RateLimitExceeded(scope, (1.0 - tokens) / rate)
+                updates.append((key, tokens - 1.0, now))
+            conn.executemany("INSERT OR REPLACE INTO rate_limit_buckets (bucket_key, tokens, updated_at) "
+                             "VALUES (?, ?, ?)", updates)
+            with self._lock:
+                self._checks += 1
+                prune = self._checks % self.prune_every == 0
+            if prune:
+                # Bir saattir dokunulmayan kovalar çoktan dolmuştur
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - 3600,))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._stats["busy_fail_open"] += 1
+            return None
+        with self._lock:
+            self._stats["allowed"] += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+        data.update({"backend": "sqlite", "path": self.path})
+        return data
@@ -0,0 +1,148 @@
+"""
+Tekrarlanan sorular için birebir eşleşen yanıt önbelleği
+
+Fiyat, garanti gibi ilk tur soruları agent başına sık sık aynı şekilde
+geliyor ve her biri tam bir Gemini çağrısına mal oluyordu. Anahtar:
+agent konfig versiyonu + normalize kullanıcı mesajı + kompakt geçmişin
+özeti. Böylece konfig ya da sohbet bağlamı değişince eski yanıt kullanılmaz.
+
+İki backend var:
+- MemoryResponseCache: süreç içi, LRU + TTL
+- SQLiteResponseCache: ayrı bir SQLite dosyasında tablo; aynı makinedeki
+  tüm worker'lar paylaşır
+"""
+# YAZAN: Backend Developer
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+_WS_RE = re.compile(r"\s+")
+_TRAILING_PUNCT = " \t\r\n.!?…"
+
+
+def normalize_message(message: str) -> str:
+    """
+    Mesajı önbellek anahtarı için normalize eder: Türkçe uyumlu küçük harf,
+    boşlukları sadeleştirme, sondaki noktalama işaretlerini atma.
+
+    Guard eşleştirmesindeki fold_text (ı/I/İ -> i) burada kullanılmaz: birebir
+    yanıt önbelleğinde "kır" ile "kir" gibi farklı kelimeler aynı anahtara düşerdi.
+    """
+    text = (message or "").replace("I", "ı").replace("İ", "i").lower()
+    return _WS_RE.sub(" ", text).strip(_TRAILING_PUNCT)
+
+
+def make_cache_key(agent_id: str, config_version: str, user_message: str, history_text: str) -> str:
+    """Agent, konfig versiyonu, normalize mesaj ve geçmiş özetinden anahtar üretir."""
+    history_hash = hashlib.sha1((history_text or "").encode("utf-8")).hexdigest()
+    raw = "\x1f".join([str(agent_id), str(config_version), normalize_message(user_message), history_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryResponseCache:
+    """Süreç içi yanıt önbelleği (LRU + kayıt bazında TTL)."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 5000):
+        self._cache = TTLCache(max_size=max_entries, ttl=300, name="response_cache")
+
+    def get(self, key: str):
+        found, value = self._cache.get(key)
+        return value if found else None
+
+    def set(self, key: str, value: dict, ttl: float):
+        self._cache.set(key, value, ttl=ttl)
+
+    def stats(self) -> dict:
+        data = self._cache.stats()
+        data["backend"] = "memory"
+        return data
+
+
+class SQLiteResponseCache:
+    """
+    SQLite tablosunda tutulan yanıt önbelleği.
+
+    Bloklayıcıdır; async kod içinden DB thread havuzunda çağrılmalıdır.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                cache_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_hit REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_hit ON response_cache (last_hit)")
+        self._conn.commit()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._writes = 0
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (key,))
+                    self._conn.commit()
+                self._misses += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET last_hit = ? WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+            self._hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (cache_key, value, expires_at, last_hit) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+            )
+            self._writes += 1
+            # Boyut sınırı: ara sıra süresi dolanları ve en az kullanılanları sil
+            if self._writes % 100 == 0:
+                self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+                count = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM response_cache WHERE cache_key IN "
+                        "(SELECT cache_key FROM response_cache ORDER BY last_hit ASC LIMIT ?)",
+                        (overflow,)
+                    )
+                    self._evictions += overflow
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        return {
+            "name": "response_cache",
+            "backend": "sqlite",
+            "size": size,
+            "max_size": self.max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+        }
@@ -0,0 +1,193 @@
+"""
+Tek makinelik kurulumlar için ayarlı SQLite erişimi
+
+Varsayılan `sqlite3.connect(DB_PATH)` ayarlarıyla (rollback journal,
+synchronous=FULL) eşzamanlı /chat yazmaları sıraya giriyor ve "database is
+locked" hatası alıyordu. Bu modül:
+
+- WAL journal: okuyucular yazarı, yazar okuyucuları beklemez
+- synchronous / cache_size / mmap_size / busy_timeout pragmaları ayarlanabilir
+- Thread başına bir okuyucu bağlantısı (query_only; kilit yok, havuz yok)
+- Tek yazar bağlantısı: süreç içindeki yazmalar bir kilitle sıraya girer,
+  transaction'lar `BEGIN IMMEDIATE` ile açılır; SQLite seviyesinde kilit
+  yarışı (ve busy_timeout'u atlayan kilit yükseltme hatası) oluşmaz
+
+Bağlantılar `close()` ile kapanmaz, sahibine iade edilir; mevcut
+`conn = get_db_connection() ... conn.close()` kalıbı değişmeden çalışır.
+"""
+# YAZAN: DevOps & Backend Developer
+
+import sqlite3
+import threading
+import time
+
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class StoreConnection:
+    """Okuyucu veya yazar bağlantısını saran ince proxy; close() iade eder."""
+
+    __slots__ = ("_release", "_conn")
+
+    def __init__(self, conn, release):
+        self._conn = conn
+        self._release = release
+
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise RuntimeError("Bağlantı iade edilmiş")
+        return getattr(conn, name)
+
+    def close(self):
+        # İki kez close() çağrılması güvenlidir
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._release(conn)
+
+
+class SQLiteStore:
+    """
+    Args:
+        path: Veritabanı dosyası
+        journal_mode: WAL önerilir (dosyada kalıcıdır)
+        synchronous: WAL ile NORMAL, commit başına fsync yapmaz; çökme
+            durumunda son commit'ler kaybolabilir ama veritabanı bozulmaz
+        cache_size: Bağlantı başına sayfa önbelleği (negatif: KiB)
+        mmap_size: Bellek eşlemeli okuma boyutu (bayt, 0 = kapalı)
+        busy_timeout_ms: Başka süreç kilidi tutarken bekleme süresi
+    """
+
+    def __init__(self, path: str, journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 cache_size: int = -65536, mmap_size: int = 268435456, busy_timeout_ms: int = 5000):
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Geçersiz journal_mode: {journal_mode} (geçerli: {', '.join(JOURNAL_MODES)})")
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Geçersiz synchronous: {synchronous} (geçerli: {', '.join(SYNCHRONOUS_MODES)})")
+        self.path = path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = int(cache_size)
+        self.mmap_size = int(mmap_size)
+        self.busy_timeout_ms = int(busy_timeout_ms)
+
+        self._local = threading.local()
+        self._readers = []   # kapanışta kapatmak için
+        self._lock = threading.Lock()   # okuyucu listesi ve istatistikler
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+        self._stats = {"reads": 0, "writes": 0, "writer_waits": 0, "writer_wait_ms": 0.0, "writer_timeouts": 0}
+
+    def connect(self, readonly: bool = False, isolation_level: str = ""):
+        """Pragmaları uygulanmış yeni ham bağlantı (havuz dışı kullanımlar için de)."""
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0, check_same_thread=False,
+                               isolation_level=isolation_level)
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {self.cache_size}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _writer_conn(self):
+        if self._writer is None:
+            conn = self.connect(isolation_level="IMMEDIATE")
+            mode = conn.execute(f"PRAGMA journal_mode = {self.journal_mode}").fetchone()[0]
+            if mode.upper() != self.journal_mode:
+                print(f"UYARI: SQLite journal_mode {self.journal_mode} yapılamadı, {mode} kullanılıyor")
+            self._writer = conn
+        return self._writer
+
+    def reader(self) -> StoreConnection:
+        """Bu thread'in okuyucu bağlantısı (ilk kullanımda açılır)."""
+        if self._closed:
+            raise RuntimeError("SQLite deposu kapatılmış")
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect(readonly=True)
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        with self._lock:
+            self._stats["reads"] += 1
+        return StoreConnection(conn, self._release_reader)
+
+    def writer(self) -> StoreConnection:
+        """
+        Tek yazar bağlantısını alır; iade edilene kadar diğer yazarlar bekler.
+
+        Raises:
+            sqlite3.OperationalError: busy_timeout içinde alınamadı
+        """
+        if self._closed:
+            raise RuntimeError("SQLite deposu kapatılmış")
+        if not self._writer_lock.acquire(blocking=False):
+            started = time.monotonic()
+            acquired = self._writer_lock.acquire(timeout=self.busy_timeout_ms / 1000.0)
+            with self._lock:
+                self._stats["writer_waits"] += 1
+                self._stats["writer_wait_ms"] += (time.monotonic() - started) * 1000
+                if not acquired:
+                    self._stats["writer_timeouts"] += 1
+            if not acquired:
+                raise sqlite3.OperationalError("database is locked (yazar bağlantısı meşgul)")
+        try:
+            conn = self._writer_conn()
+        except Exception:
+            self._writer_lock.release()
+            raise
+        with self._lock:
+            self._stats["writes"] += 1
+        return StoreConnection(conn, self._release_writer)
+
+    def _release_reader(self, conn):
+        # Açık okuma anlık görüntüsü kalmasın (WAL checkpoint'i engellemesin)
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _release_writer(self, conn):
+        try:
+            # Commit edilmemiş işlemleri geri al: sonraki yazar temiz başlasın
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        finally:
+            self._writer_lock.release()
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data["readers"] = len(self._readers)
+        data["writer_open"] = self._writer is not None
+        data["writer_in_use"] = self._writer_lock.locked()
+        data.update({
+            "path": self.path,
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "cache_size": self.cache_size,
+            "mmap_size": self.mmap_size,
+            "busy_timeout_ms": self.busy_timeout_ms,
+            "writer_wait_ms": round(data["writer_wait_ms"], 3),
+        })
+        return data
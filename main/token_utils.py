@@ -0,0 +1,73 @@
+"""
+Token sayımı yardımcıları
+
+Gemini'nin count_tokens çağrısı her seferinde ayrı bir ağ isteğidir.
+Burada ağ kullanmadan token sayısı elde etmenin iki yolu var:
+- Üretim yanıtındaki usage_metadata (kesin değer; google-generativeai >= 0.5,
+  alanlar: prompt_token_count / candidates_token_count / total_token_count)
+- Yerel tahmin (usage_metadata yoksa veya tahmin modu seçildiyse)
+"""
+# YAZAN: Backend Developer
+
+import re
+
+# Kelime parçaları ve tek tek noktalama işaretleri
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# SentencePiece tabanlı modellerde Türkçe kelimeler ortalama ~4 karakterde
+# bir parçalanır; kısa kelimeler tek token sayılır.
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Metnin token sayısını ağ çağrısı yapmadan tahmin eder.
+
+    Kesin değildir ama maliyet takibi ve bütçe hesapları için yeterince yakındır.
+    """
+    if not text:
+        return 0
+    total = 0
+    for piece in _TOKEN_RE.findall(text):
+        n = len(piece)
+        if n <= _CHARS_PER_TOKEN:
+            total += 1
+        else:
+            total += (n + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return total
+
+
+def usage_total_tokens(response):
+    """
+    Gemini yanıtındaki usage_metadata'dan toplam token sayısını okur.
+
+    Returns:
+        Toplam token (prompt + yanıt) veya metadata yoksa None
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_token_count", 0) or 0
+    if not total:
+        total = (getattr(usage, "prompt_token_count", 0) or 0) + (getattr(usage, "candidates_token_count", 0) or 0)
+    return total or None
+
+
+def truncate_to_tokens(text: str, max_tokens: int):
+    """
+    Metni, estimate_tokens'a göre en fazla `max_tokens` token olacak şekilde keser.
+
+    Returns:
+        (metin, kesildi_mi)
+    """
+    if not text:
+        return "", False
+    if max_tokens <= 0:
+        return "", True
+    total = 0
+    for match in _TOKEN_RE.finditer(text):
+        n = len(match.group())
+        total += 1 if n <= _CHARS_PER_TOKEN else (n + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+        if total > max_tokens:
+            return text[:match.start()].rstrip(), True
+    return text, False
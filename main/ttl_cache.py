@@ -0,0 +1,106 @@
+"""
+Süreç içi LRU + TTL önbellek
+
+Sık okunan ama nadiren değişen veriler (agent konfigürasyonu vb.) için
+kullanılır. Thread-safe'tir; hem event loop'tan hem DB thread'lerinden
+çağrılabilir. Bulunamayan anahtarlar için negatif önbellekleme destekler.
+"""
+# YAZAN: Backend Developer
+
+import threading
+import time
+from collections import OrderedDict
+
+# Negatif önbellek kaydı (anahtar var ama "bulunamadı" olarak işaretli)
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Boyut sınırlı (LRU) ve süre sınırlı (TTL) önbellek.
+
+    Args:
+        max_size: En fazla tutulacak kayıt sayısı; aşılınca en eski kullanılan atılır
+        ttl: Kayıt ömrü (sn)
+        negative_ttl: "Bulunamadı" kayıtlarının ömrü (sn)
+        name: İstatistiklerde görünen ad
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 60.0, negative_ttl: float = 10.0, name: str = "cache"):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._negative_hits = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """
+        Returns:
+            (bulundu_mu, değer) — negatif kayıtlarda (True, None) döner
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._misses += 1
+                return False, None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self._misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            if value is _MISSING:
+                self._negative_hits += 1
+                return True, None
+            self._hits += 1
+            return True, value
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def set_missing(self, key):
+        """Anahtarı kısa süreliğine "bulunamadı" olarak işaretler."""
+        self.set(key, _MISSING, ttl=self.negative_ttl)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_matching(self, predicate):
+        """predicate(key, value) True dönen tüm kayıtları siler (negatifler hariç)."""
+        with self._lock:
+            doomed = [k for k, (_, v) in self._data.items() if v is not _MISSING and predicate(k, v)]
+            for k in doomed:
+                del self._data[k]
+        return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "negative_hits": self._negative_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
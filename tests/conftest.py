@@ -0,0 +1,51 @@
+"""
+Ortak test ayarları
+
+main_receiver import edilirken veritabanını açıp migrasyonları çalıştırır;
+bu yüzden DB ve yan dosyalar import'tan önce geçici bir dizine yönlendirilir.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+MAIN_DIR = Path(__file__).resolve().parent.parent / "main"
+sys.path.insert(0, str(MAIN_DIR))
+
+_TMP = Path(tempfile.mkdtemp(prefix="kremna-tests-"))
+os.environ.setdefault("DB_PATH", str(_TMP / "personas.db"))
+os.environ.setdefault("RESPONSE_CACHE_SQLITE_PATH", str(_TMP / "response_cache.db"))
+os.environ.setdefault("RATE_LIMIT_SQLITE_PATH", str(_TMP / "rate_limits.db"))
+os.environ.setdefault("HISTORY_ARCHIVE_DIR", str(_TMP / "history_archive"))
+os.environ.setdefault("EXPORT_API_KEY", "test-export-key")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+
+@pytest.fixture(scope="session")
+def receiver():
+    import main_receiver
+    return main_receiver
+
+
+@pytest.fixture(scope="session")
+def client(receiver):
+    from fastapi.testclient import TestClient
+    return TestClient(receiver.app)
+
+
+@pytest.fixture
+def db_execute(receiver):
+    """Yazma bağlantısıyla tek ifade çalıştırır (test verisi hazırlamak için)."""
+    def execute(sql, params=()):
+        conn = receiver.get_db_connection(write=True)
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall() if cur.description else None
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+    return execute
@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def agents(client):
+    ids = [f"list-agent-{i:02d}" for i in range(7)]
+    for agent_id in ids:
+        body = {"agentId": agent_id, "persona_title": agent_id, "model_instructions": {"tone": "x", "rules": ["r1"]},
+                "initial_context": {"k": "v"}}
+        assert client.post("/agent_config", json=body).status_code == 200
+    return ids
+
+
+def all_pages(client, path, **params):
+    seen, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        data = client.get(path, params=query).json()
+        key = "agents" if path == "/agents" else "personas"
+        assert len(data[key]) <= int(params["limit"])
+        seen.extend(item["agent_id"] for item in data[key])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_keyset_pages_cover_every_agent_once(client, db_execute, agents):
+    expected = [row[0] for row in db_execute("SELECT agent_id FROM agent_configurations ORDER BY id")]
+    seen = all_pages(client, "/agents", limit="2")
+    assert seen == expected and set(agents) <= set(seen)
+    assert all_pages(client, "/persona_liste", limit="3") == list(reversed(expected))
+
+
+def test_fields_selection_and_structured_values(client, agents):
+    data = client.get("/agents", params={"limit": "500", "fields": "agent_id,rules,initial_context"}).json()
+    item = next(a for a in data["agents"] if a["agent_id"] == agents[0])
+    assert item == {"agent_id": agents[0], "rules": ["r1"], "initial_context": {"k": "v"}}
+
+
+@pytest.mark.parametrize("params", [{"limit": "0"}, {"limit": "abc"}, {"cursor": "bozuk"}, {"fields": "bogus"}])
+def test_invalid_params_return_400(client, params):
+    response = client.get("/agents", params=params)
+    assert response.status_code == 400 and response.json()["status"] == "error"
+
+
+def test_etag_changes_after_update(client, receiver, agents):
+    first = client.get("/agents", params={"limit": "5"})
+    etag = first.headers["etag"]
+    assert client.get("/agents", params={"limit": "5"}, headers={"If-None-Match": etag}).status_code == 304
+    body = {"agentId": agents[0], "persona_title": "güncel", "model_instructions": {"tone": "y"}}
+    client.post("/agent_config", json=body)
+    assert client.get("/agents", params={"limit": "5"}, headers={"If-None-Match": etag}).status_code == 200
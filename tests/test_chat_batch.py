@@ -0,0 +1,38 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+
+class RecordingModel:
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=f"cevap {len(self.prompts)}", usage_metadata=None)
+
+
+@pytest.fixture
+def model(receiver, monkeypatch):
+    model = RecordingModel()
+    monkeypatch.setattr(receiver, "ensure_gemini_configured", lambda: True)
+    monkeypatch.setattr(receiver.gemini, "model_for", lambda agent_id: model)
+    return model
+
+
+@pytest.mark.parametrize("buffer_enabled", [False, True])
+def test_batch_items_see_earlier_turns_of_same_session(receiver, client, model, monkeypatch, buffer_enabled):
+    monkeypatch.setattr(receiver, "HISTORY_BUFFER_ENABLED", buffer_enabled)
+    session_id = f"batch-order-{buffer_enabled}"
+    items = [{"id": f"q{i}", "session_id": session_id, "user_message": f"soru numarası {i}"} for i in range(3)]
+    items.append({"id": "other", "session_id": "batch-other", "user_message": "başka oturum"})
+    response = client.post("/chat/batch", json={"agent_id": "demo-agent", "items": items, "concurrency": 2})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["succeeded"] == 4 and lines[-1]["history_saved"]
+
+    by_item = {i: next(p for p in model.prompts if f'"""soru numarası {i}"""' in p) for i in range(3)}
+    assert by_item[0].count("soru numarası 0") == 1
+    assert "soru numarası 0" in by_item[1] and "cevap" in by_item[1]
+    assert "soru numarası 0" in by_item[2] and "soru numarası 1" in by_item[2]
+    assert "başka oturum" not in by_item[2]
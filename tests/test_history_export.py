@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+HEADERS = {"X-Export-Key": "test-export-key"}
+
+
+@pytest.fixture
+def history_rows(receiver, db_execute):
+    """Bugün, uygulamanın yazdığı biçimde (isoformat) 8 satır + DEFAULT CURRENT_TIMESTAMP biçiminde 1 satır."""
+    agent_id = "export-test-agent"
+    db_execute("DELETE FROM chat_history WHERE agent_id = ?", (agent_id,))
+    now = datetime.now().replace(microsecond=123456)
+    rows = [("s1", agent_id, "user", f"m{i}", now - timedelta(minutes=i)) for i in range(8)]
+    receiver.save_chat_messages_batch(rows)
+    db_execute("INSERT INTO chat_history (session_id, agent_id, role, message, timestamp, seq) VALUES (?, ?, ?, ?, ?, ?)",
+               ("s2", agent_id, "user", "legacy", (now - timedelta(days=2)).strftime("%Y-%m-%d %H:%M:%S"), 1))
+    return agent_id, now
+
+
+def export_lines(client, **params):
+    response = client.get("/export/chat_history", headers=HEADERS, params=params)
+    assert response.status_code == 200, response.text
+    return response.text.splitlines()
+
+
+def test_until_end_of_day_includes_todays_rows(client, history_rows):
+    agent_id, now = history_rows
+    until = now.replace(hour=23, minute=59, second=59, microsecond=0) + timedelta(seconds=1)
+    assert len(export_lines(client, agent_id=agent_id, session_id="s1", until=until.isoformat())) == 8
+
+
+def test_since_excludes_older_rows_on_same_day(client, history_rows):
+    agent_id, now = history_rows
+    since = now - timedelta(minutes=2, seconds=30)
+    assert len(export_lines(client, agent_id=agent_id, since=since.isoformat())) == 3
+
+
+def test_since_is_inclusive_and_until_exclusive(client, history_rows):
+    agent_id, now = history_rows
+    lines = export_lines(client, agent_id=agent_id, since=(now - timedelta(minutes=3)).isoformat(),
+                         until=(now - timedelta(minutes=1)).isoformat())
+    assert len(lines) == 2
+
+
+def test_filters_mix_of_stored_formats(client, history_rows):
+    agent_id, now = history_rows
+    lines = export_lines(client, agent_id=agent_id, since=(now - timedelta(days=3)).date().isoformat(),
+                         until=(now - timedelta(days=1)).isoformat())
+    assert len(lines) == 1 and '"legacy"' in lines[0]
+
+
+def test_aware_bounds_are_converted_to_local_time(client, history_rows):
+    agent_id, now = history_rows
+    since = (now - timedelta(minutes=2, seconds=30)).astimezone().astimezone(timezone.utc)
+    assert len(export_lines(client, agent_id=agent_id, since=since.isoformat())) == 3
+
+
+def test_parse_export_time(receiver):
+    assert receiver.parse_export_time("") is None
+    assert receiver.parse_export_time("2025-01-31") == datetime(2025, 1, 31)
+    aware = receiver.parse_export_time("2025-01-31T12:00:00Z")
+    assert aware == datetime(2025, 1, 31, 12, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    with pytest.raises(ValueError):
+        receiver.parse_export_time("yarın")
+
+
+def export_request():
+    from starlette.requests import Request
+    return Request({"type": "http", "method": "GET", "path": "/export/chat_history", "query_string": b"",
+                    "headers": [(b"x-export-key", b"test-export-key")], "client": ("127.0.0.1", 1)})
+
+
+def test_concurrent_exports_take_slot_before_streaming(receiver, monkeypatch):
+    import asyncio
+    import threading
+
+    monkeypatch.setattr(receiver, "EXPORT_MAX_CONCURRENT", 1)
+    active = receiver.export_state["active"]
+
+    async def scenario():
+        first = await receiver.export_chat_history(export_request())
+        second = await receiver.export_chat_history(export_request())
+        assert first.status_code == 200
+        assert second.status_code == 429
+        # Hiç tüketilmeyen yanıt thread bırakmaz; yer BackgroundTask ile geri verilir
+        assert not [t for t in threading.enumerate() if t.name.startswith("export")]
+        await first.background()
+        await first.background()
+        assert receiver.export_state["active"] == active
+        third = await receiver.export_chat_history(export_request())
+        assert third.status_code == 200
+        await third.background()
+
+    asyncio.run(scenario())
+    assert receiver.export_state["active"] == active
@@ -0,0 +1,82 @@
+import asyncio
+
+from history_writer import HistoryWriter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_rows_are_batched_and_flushed_in_order():
+    async def scenario():
+        batches = []
+
+        async def flush(rows):
+            batches.append(list(rows))
+
+        writer = HistoryWriter(flush, batch_size=3, flush_interval=0.01)
+        writer.start()
+        assert writer.submit("s1", [1, 2])
+        assert writer.submit("s2", [3, 4])
+        assert await writer.wait_flushed("s1")
+        await writer.stop()
+        return batches, writer.stats()
+
+    batches, stats = run(scenario())
+    assert [row for batch in batches for row in batch] == [1, 2, 3, 4]
+    assert max(len(batch) for batch in batches) <= 3
+    assert stats["flushed_rows"] == 4 and stats["pending_rows"] == 0
+
+
+def test_failed_flush_is_retried_without_losing_rows():
+    async def scenario():
+        written, calls = [], []
+
+        async def flush(rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise RuntimeError("db down")
+            written.extend(rows)
+
+        writer = HistoryWriter(flush, batch_size=10, flush_interval=0.01, retry_interval=0.01)
+        writer.start()
+        writer.submit("s1", ["a", "b"])
+        assert await writer.wait_flushed("s1")
+        await writer.stop()
+        return written, writer.stats()
+
+    written, stats = run(scenario())
+    assert written == ["a", "b"]
+    assert stats["flush_errors"] == 1
+
+
+def test_submit_rejected_when_not_running_or_full():
+    async def scenario():
+        async def flush(rows):
+            await asyncio.sleep(0)
+
+        writer = HistoryWriter(flush, max_pending=2)
+        assert not writer.submit("s1", [1])
+        writer.start()
+        assert writer.submit("s1", [1, 2])
+        assert not writer.submit("s1", [3])
+        await writer.stop()
+        return writer.stats()
+
+    stats = run(scenario())
+    assert stats["rejected_rows"] == 2 and stats["flushed_rows"] == 2
+
+
+def test_stop_gives_up_after_shutdown_retries():
+    async def scenario():
+        async def flush(rows):
+            raise RuntimeError("db down")
+
+        writer = HistoryWriter(flush, flush_interval=0.01, retry_interval=0.001, shutdown_retries=2)
+        writer.start()
+        writer.submit("s1", [1, 2, 3])
+        await writer.stop()
+        return writer.stats()
+
+    stats = run(scenario())
+    assert stats["dropped_rows"] == 3 and stats["pending_rows"] == 0
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+
+import pytest
+
+# Migrasyonlardan önceki (ilk sürüm) SQLite şeması
+LEGACY_SCHEMA = [
+    """CREATE TABLE personas (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, tone TEXT,
+       constraints TEXT, created_at TEXT DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE agent_configurations (id INTEGER PRIMARY KEY AUTOINCREMENT, agent_id TEXT UNIQUE NOT NULL,
+       persona_title TEXT, tone TEXT, rules TEXT, prohibited_topics TEXT, initial_context TEXT,
+       created_at TEXT DEFAULT CURRENT_TIMESTAMP, updated_at TEXT DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE chat_history (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, agent_id TEXT,
+       persona_id INTEGER, role TEXT, message TEXT, timestamp TEXT DEFAULT CURRENT_TIMESTAMP)""",
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO agent_configurations (agent_id, persona_title, tone, rules, prohibited_topics, initial_context) "
+        "VALUES (?, ?, ?, ?, ?, ?)", [
+            ("text-agent", "Eski", "Resmi", "Kısa cevap ver, net ol\nTürkçe cevap ver", "Rakipler, Fiyat sızıntıları",
+             "company_slogan: Kalite: her şey\npricing: kademeli"),
+            ("single-rule", "Tek", "", "Tek kural, virgüllü", "", ""),
+            ("json-agent", "Demo", "", json.dumps(["a", "b"]), json.dumps([]), json.dumps({"k": "v"})),
+            ("numeric-rule", "Sayı", "", "42", "", ""),
+        ])
+    conn.executemany("INSERT INTO chat_history (session_id, agent_id, role, message) VALUES (?, ?, ?, ?)",
+                     [("s1", "text-agent", "user", "m1"), ("s1", "text-agent", "assistant", "m2")])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_all_migrations_apply_to_legacy_schema(receiver, legacy_db):
+    receiver.run_migrations(legacy_db)
+    versions = [row[0] for row in legacy_db.execute("SELECT version FROM schema_migrations ORDER BY version")]
+    assert versions == [version for version, _, _ in receiver.MIGRATIONS]
+    assert {"response_cache_ttl", "guard_rules", "rate_limits", "prompt_token_budget",
+            "config_version"} <= columns(legacy_db, "agent_configurations")
+    assert "seq" in columns(legacy_db, "chat_history")
+    assert {"idx_chat_history_session_agent_seq", "idx_agent_configurations_updated_at",
+            "idx_chat_history_agent_id"} <= indexes(legacy_db)
+    assert legacy_db.execute("SELECT name FROM sqlite_master WHERE name = 'chat_summaries'").fetchone()
+
+
+def test_seq_backfill_keeps_session_order(receiver, legacy_db):
+    receiver.run_migrations(legacy_db)
+    rows = legacy_db.execute("SELECT message, seq FROM chat_history ORDER BY seq").fetchall()
+    assert [message for message, _ in rows] == ["m1", "m2"]
+
+
+def test_legacy_text_config_becomes_json(receiver, legacy_db):
+    receiver.run_migrations(legacy_db)
+    rows = {row[0]: row[1:] for row in legacy_db.execute(
+        "SELECT agent_id, rules, prohibited_topics, initial_context, config_version FROM agent_configurations")}
+    rules, topics, context, version = rows["text-agent"]
+    assert json.loads(rules) == ["Kısa cevap ver, net ol", "Türkçe cevap ver"]
+    assert json.loads(topics) == ["Rakipler", "Fiyat sızıntıları"]
+    assert json.loads(context) == {"company_slogan": "Kalite: her şey", "pricing": "kademeli"}
+    assert version == 1
+    assert json.loads(rows["single-rule"][0]) == ["Tek kural, virgüllü"]
+    assert json.loads(rows["single-rule"][2]) == {}
+    assert json.loads(rows["json-agent"][0]) == ["a", "b"]
+    assert json.loads(rows["numeric-rule"][0]) == ["42"]
+
+
+def test_migrations_are_idempotent(receiver, legacy_db):
+    receiver.run_migrations(legacy_db)
+    before = legacy_db.execute("SELECT rules FROM agent_configurations ORDER BY id").fetchall()
+    receiver.run_migrations(legacy_db)
+    assert legacy_db.execute("SELECT rules FROM agent_configurations ORDER BY id").fetchall() == before
+    assert legacy_db.execute("SELECT COUNT(*) FROM schema_migrations").fetchone()[0] == len(receiver.MIGRATIONS)
+
+
+def test_migrated_prompt_text_matches_legacy_format(receiver):
+    assert receiver.rules_text(["a", "b"]) == "a\nb"
+    assert receiver.topics_text(["x", "y"]) == "x, y"
+    assert receiver.context_text({"k": "v", "n": 1}) == "k: v\nn: 1"
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from starlette.requests import Request
+
+import rate_limiter
+from rate_limiter import MemoryRateLimiter, SQLiteRateLimiter
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    monkeypatch.setattr(rate_limiter.time, "time", clock)
+    if request.param == "memory":
+        return MemoryRateLimiter(), clock
+    return SQLiteRateLimiter(str(tmp_path / "rl.db")), clock
+
+
+def test_bucket_allows_burst_then_limits(limiter):
+    limiter, _ = limiter
+    limits = [("session", "s:1", 1.0, 2.0)]
+    assert limiter.check(limits) is None
+    assert limiter.check(limits) is None
+    exceeded = limiter.check(limits)
+    assert exceeded is not None and exceeded.scope == "session"
+    assert exceeded.retry_after_seconds == 1
+
+
+def test_bucket_refills_over_time(limiter):
+    limiter, clock = limiter
+    limits = [("session", "s:1", 0.5, 1.0)]
+    assert limiter.check(limits) is None
+    assert limiter.check(limits) is not None
+    clock.now += 2.0
+    assert limiter.check(limits) is None
+
+
+def test_rejected_check_does_not_consume_other_buckets(limiter):
+    limiter, _ = limiter
+    assert limiter.check([("session", "s:1", 1.0, 1.0)]) is None
+    exceeded = limiter.check([("agent", "a:1", 1.0, 5.0), ("session", "s:1", 1.0, 1.0)])
+    assert exceeded.scope == "session"
+    for _ in range(5):
+        assert limiter.check([("agent", "a:1", 1.0, 5.0)]) is None
+
+
+def make_request():
+    return Request({"type": "http", "method": "POST", "path": "/chat", "headers": [], "client": ("127.0.0.1", 1)})
+
+
+def test_agent_limits_apply_on_cold_config_cache(receiver, client, monkeypatch):
+    monkeypatch.setattr(receiver, "rate_limiter", MemoryRateLimiter())
+    body = {"agentId": "rate-limit-agent", "persona_title": "Test", "model_instructions": {"tone": "x"},
+            "rate_limits": {"session_per_min": 1, "session_burst": 2}}
+    assert client.post("/agent_config", json=body).status_code == 200
+
+    # Başka bir worker veya TTL sonrası: önbellek boş
+    receiver.agent_config_cache.clear()
+    agent_config = asyncio.run(receiver.load_agent_config_async("rate-limit-agent"))
+
+    def check():
+        return asyncio.run(receiver.check_agent_rate_limits("rate-limit-agent", "s1", agent_config))
+
+    assert check() is None
+    assert check() is None
+    limited = check()
+    assert limited is not None and limited.status_code == 429
+
+
+def test_unknown_agent_uses_default_limits(receiver, monkeypatch):
+    monkeypatch.setattr(receiver, "rate_limiter", MemoryRateLimiter())
+    request = make_request()
+    burst = int(receiver.RATE_LIMIT_SESSION_BURST)
+
+    def check():
+        return asyncio.run(receiver.check_client_rate_limits(request, "missing", "s1"))
+
+    for _ in range(burst):
+        assert check() is None
+    assert check().status_code == 429
+
+
+def test_ip_limit_applies_before_config_lookup(receiver, client, monkeypatch):
+    monkeypatch.setattr(receiver, "rate_limiter", MemoryRateLimiter())
+    monkeypatch.setattr(receiver, "IP_RATE_LIMIT", (1 / 60.0, 3.0))
+    lookups = []
+    monkeypatch.setattr(receiver, "load_agent_config", lambda agent_id: lookups.append(agent_id))
+
+    statuses = [client.post("/chat", json={"agent_id": f"random-{i}", "session_id": f"s{i}",
+                                          "user_message": "merhaba"}).status_code for i in range(5)]
+    assert statuses == [404, 404, 404, 429, 429]
+    assert len(lookups) == 3
+
+
+def test_sqlite_backend_runs_off_the_event_loop(receiver, tmp_path, monkeypatch):
+    monkeypatch.setattr(receiver, "rate_limiter", SQLiteRateLimiter(str(tmp_path / "rl.db")))
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ratelimit-test")
+    monkeypatch.setattr(receiver, "rate_limit_executor", executor)
+    threads = []
+    original = receiver.rate_limiter.check
+    monkeypatch.setattr(receiver.rate_limiter, "check",
+                        lambda buckets: threads.append(threading.current_thread().name) or original(buckets))
+    try:
+        assert asyncio.run(receiver.check_client_rate_limits(make_request(), "a", "s1")) is None
+    finally:
+        executor.shutdown(wait=True)
+    assert threads and threads[0].startswith("ratelimit-test")
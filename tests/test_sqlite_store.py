@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+
+import pytest
+
+from sqlite_store import SQLiteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.db"), busy_timeout_ms=200)
+    conn = store.writer()
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.close()
+    yield store
+    store.close()
+
+
+def test_wal_mode_and_readonly_readers(store):
+    conn = store.writer()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0].upper() == "WAL"
+    conn.close()
+    reader = store.reader()
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("INSERT INTO t VALUES (1)")
+    reader.close()
+
+
+def test_uncommitted_writes_are_rolled_back_on_release(store):
+    conn = store.writer()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+    reader = store.reader()
+    assert reader.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    reader.close()
+
+
+def test_busy_writer_times_out(store):
+    held = store.writer()
+    errors = []
+
+    def try_write():
+        try:
+            store.writer().close()
+        except sqlite3.OperationalError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=try_write)
+    thread.start()
+    thread.join()
+    held.close()
+    assert len(errors) == 1
+    assert store.stats()["writer_timeouts"] == 1
+
+
+def test_concurrent_reader_counts_are_exact(store):
+    def read():
+        for _ in range(500):
+            store.reader().close()
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = store.stats()
+    assert stats["reads"] == 8 * 500
+    assert stats["readers"] == 8
+
+
+def test_invalid_pragmas_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteStore(str(tmp_path / "x.db"), journal_mode="wall")
+
+
+def test_metrics_report_sqlite_store(receiver, client):
+    assert receiver.sqlite_store is not None
+    text = client.get("/metrics").text
+    assert 'kremna_db_pool_connections{state="readers"}' in text
+    assert 'kremna_db_pool_events_total{event="writes"}' in text
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import pytest
+
+from token_utils import estimate_tokens, usage_total_tokens
+
+
+def usage(prompt=0, candidates=0, total=0):
+    return SimpleNamespace(usage_metadata=SimpleNamespace(prompt_token_count=prompt, candidates_token_count=candidates,
+                                                          total_token_count=total))
+
+
+def test_usage_total_tokens_reads_sdk_fields():
+    assert usage_total_tokens(usage(11, 7, 18)) == 18
+    assert usage_total_tokens(usage(11, 7, 0)) == 18
+
+
+def test_usage_total_tokens_without_metadata():
+    assert usage_total_tokens(SimpleNamespace()) is None
+    assert usage_total_tokens(usage()) is None
+
+
+def test_count_turn_tokens_modes(receiver, monkeypatch):
+    prompt, answer = "Merhaba, fiyatlar nedir?", "Fiyatlarımız kademelidir."
+    monkeypatch.setattr(receiver, "TOKEN_ACCOUNTING", "exact")
+    assert receiver.count_turn_tokens(usage(11, 7, 18), prompt, answer) == 18
+    assert receiver.count_turn_tokens(SimpleNamespace(), prompt, answer) == estimate_tokens(prompt) + estimate_tokens(answer)
+    monkeypatch.setattr(receiver, "TOKEN_ACCOUNTING", "estimate")
+    assert receiver.count_turn_tokens(usage(11, 7, 18), prompt, answer) == estimate_tokens(prompt) + estimate_tokens(answer)
+
+
+def test_sdk_response_exposes_usage_metadata():
+    genai = pytest.importorskip("google.generativeai")
+    protos = getattr(genai, "protos", None)
+    if protos is None:
+        pytest.skip("google-generativeai < 0.5: usage_metadata yok")
+    from google.generativeai.types import generation_types
+    proto = protos.GenerateContentResponse(
+        candidates=[{"content": {"parts": [{"text": "merhaba"}], "role": "model"}, "index": 0}],
+        usage_metadata={"prompt_token_count": 11, "candidates_token_count": 7, "total_token_count": 18})
+    assert usage_total_tokens(generation_types.GenerateContentResponse.from_response(proto)) == 18
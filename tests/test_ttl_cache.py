@@ -0,0 +1,63 @@
+import pytest
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 100.0
+
+        def __call__(self):
+            return self.now
+
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_get_set_and_expiry(clock):
+    cache = TTLCache(max_size=10, ttl=5)
+    cache.set("a", 1)
+    assert cache.get("a") == (True, 1)
+    clock.now += 5
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_negative_entries_use_negative_ttl(clock):
+    cache = TTLCache(max_size=10, ttl=60, negative_ttl=2)
+    cache.set_missing("x")
+    assert cache.get("x") == (True, None)
+    clock.now += 2
+    assert cache.get("x") == (False, None)
+    assert cache.stats()["negative_hits"] == 1
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1) and cache.get("c") == (True, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_matching_skips_negative_entries(clock):
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("k1", {"agent_id": "a"})
+    cache.set("k2", {"agent_id": "b"})
+    cache.set_missing("k3")
+    assert cache.invalidate_matching(lambda k, v: v["agent_id"] == "a") == 1
+    assert cache.get("k1") == (False, None)
+    assert cache.get("k2")[0] and cache.get("k3") == (True, None)
+
+
+def test_per_entry_ttl(clock):
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("short", 1, ttl=1)
+    clock.now += 1
+    assert cache.get("short") == (False, None)